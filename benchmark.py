@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# PS extract benchmark python script.
+# (C) 2024
+#
+# Initial author: LD40
+#
+# SPDX-License-Identifier:    GPL-3.0-or-later license
+"""
+This program measures the performance of extract.py on synthetic Polarsteps trips
+- a trip is generated with the same layout as PS exports (trip.json, locations.json and {slug}_{id}/photos folders) at the requested scale
+- extract.py is run on a copy of this trip for each output mode (text, local html, emails sent to a local SMTP server)
+- wall time, peak memory and files processed per second of each run are written in JSON, to compare versions of the script
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import platform
+import tempfile
+import threading
+import subprocess
+import socketserver
+import datetime
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# parameters of the generated trip (can be changed with options)
+steps = 50  # number of steps
+photos = 5  # number of photos per step
+videos = 0  # number of videos per step (generated with ffmpeg)
+photo_width = 1600  # size (in pixels) of generated photos
+photo_height = 1200
+locations = 5000  # number of tracked locations
+modes = ["-v", "-l", "-e"]  # output modes measured (-e sends emails to a local SMTP server)
+extra_args = None  # options given to every run (None for maps without network, when the measured script has the -t option)
+runs = 1  # number of runs of each mode (next runs reuse files generated by the first one)
+script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract.py")
+output_path = None  # JSON file where results are written (printed otherwise)
+keep_path = None  # directory where the generated trip and outputs are kept (temporary directory removed otherwise)
+
+# code run in the measured process: extract.py is run as main program, with emails sent to the local SMTP server
+# (whatever the server and port set in the script)
+runner_code = """
+import runpy, smtplib, sys
+port = int(sys.argv[1])
+SMTP = smtplib.SMTP
+class LocalSMTP(SMTP):
+    def __init__(self, *args, **kwargs):
+        super().__init__("127.0.0.1", port)
+smtplib.SMTP = smtplib.SMTP_SSL = LocalSMTP
+sys.argv = sys.argv[2:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+# Class of the local SMTP server receiving emails of the measured runs (messages are counted and dropped)
+class SmtpSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+        self.messages = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+# Class answering SMTP commands of one connection to the local SMTP server
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 benchmark\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith(b"EHLO") or command.startswith(b"HELO"):
+                self.wfile.write(b"250-benchmark\r\n250 SIZE 1000000000\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 end data with <CR><LF>.<CR><LF>\r\n")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    size += len(data_line)
+                with self.server.lock:
+                    self.server.messages += 1
+                    self.server.bytes += size
+                self.wfile.write(b"250 ok\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+# Function to generate photos of the given size, returning their JPEG data (a few different photos, reused by all steps)
+def generate_photos(width, height, count=8):
+    data = []
+    for number in range(count):
+        noise = Image.effect_noise((width, height), 30 + 5 * number)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        image = Image.merge("RGB", (noise, gradient, gradient.rotate(90 * number)))
+        path = os.path.join(tempfile.gettempdir(), f"benchmark_{os.getpid()}_{number}.jpg")
+        image.save(path, format="JPEG", quality=90)
+        with open(path, 'rb') as f_in:
+            data.append(f_in.read())
+        os.remove(path)
+    return data
+
+
+# Function to generate a video of a few seconds with ffmpeg, returning its data (None if ffmpeg is not found)
+def generate_video(path):
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path is None:
+        return None
+    subprocess.run([ffmpeg_path, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=1280x720:duration=5", "-f", "lavfi",
+                    "-i", "sine=duration=5", "-c:v", "libx264", "-b:v", "4M", "-c:a", "aac", path], check=True, stdin=subprocess.DEVNULL)
+    with open(path, 'rb') as f_in:
+        return f_in.read()
+
+
+# Function to generate a synthetic trip in the directory in parameter, returning the number of media files written
+def generate_trip(trip_path):
+    rand = random.Random(42)  # same trip for every run of the benchmark
+    os.makedirs(trip_path)
+    start_time = 1712000000.0
+    step_duration = 86400 / 2
+    all_steps = []
+    lat, lon = 30.0, -98.0
+    photo_data = generate_photos(photo_width, photo_height) if photos > 0 else []
+    video_data = generate_video(os.path.join(trip_path, "video.mp4")) if videos > 0 else None
+    if videos > 0 and video_data is None:
+        print("! ffmpeg not found, trip generated without videos.")
+    if video_data is not None:
+        os.remove(os.path.join(trip_path, "video.mp4"))
+    media_count = 0
+    for number in range(steps):
+        lat += rand.uniform(-0.5, 0.5)
+        lon += rand.uniform(0, 0.8)
+        step_id = 90000000 + number
+        slug = f"step-{number+1}"
+        all_steps.append({"id": step_id, "name": f"Step {number+1}", "display_name": f"Step {number+1}",
+                          "description": f"Description of step {number+1}\n" + "Lorem ipsum dolor sit amet. " * rand.randint(1, 40),
+                          "slug": slug, "display_slug": slug, "start_time": start_time + number * step_duration, "end_time": None,
+                          "location": {"name": f"Place {number+1}", "detail": "Country", "full_detail": "Region, Country",
+                                       "country_code": "US", "lat": lat, "lon": lon},
+                          "timezone_id": "America/Chicago", "weather_condition": rand.choice(["rain", "clear-day", "cloudy"]),
+                          "weather_temperature": round(rand.uniform(-5, 35), 1)})
+        step_path = os.path.join(trip_path, f"{slug}_{step_id}")
+        for kind, count, data, extension in (("photos", photos, photo_data, "jpg"), ("videos", videos if video_data else 0, [video_data], "mp4")):
+            if count > 0:
+                os.makedirs(os.path.join(step_path, kind))
+            for media in range(count):
+                media_path = os.path.join(step_path, kind, f"{kind}_{number+1}_{media+1}.{extension}")
+                with open(media_path, 'wb') as f_out:
+                    f_out.write(data[(number + media) % len(data)])
+                media_time = start_time + number * step_duration + media * 60
+                os.utime(media_path, (media_time, media_time))
+                media_count += 1
+    end_time = start_time + steps * step_duration
+    trip = {"id": 10000001, "name": "Benchmark trip", "slug": "benchmark-trip", "summary": "Synthetic trip", "start_date": start_time,
+            "end_date": end_time, "total_km": steps * 80.0, "timezone_id": "Europe/Paris", "step_count": steps,
+            "travel_tracker_device": {"device_name": "benchmark"}, "all_steps": all_steps}
+    with open(os.path.join(trip_path, "trip.json"), 'w', encoding="utf-8") as f_out:
+        json.dump(trip, f_out)
+    # route going through all steps, with some noise around the straight line between them
+    track = []
+    for number in range(locations):
+        position = number * (steps - 1) / max(1, locations - 1)
+        first = all_steps[min(int(position), steps - 1)]["location"]
+        last = all_steps[min(int(position) + 1, steps - 1)]["location"]
+        ratio = position - int(position)
+        track.append({"lat": first["lat"] + (last["lat"] - first["lat"]) * ratio + rand.gauss(0, 0.001),
+                      "lon": first["lon"] + (last["lon"] - first["lon"]) * ratio + rand.gauss(0, 0.001),
+                      "time": start_time + (end_time - start_time) * number / max(1, locations)})
+    rand.shuffle(track)  # PS does not sort locations
+    with open(os.path.join(trip_path, "locations.json"), 'w', encoding="utf-8") as f_out:
+        json.dump({"locations": track}, f_out)
+    return media_count
+
+
+# Function to run extract.py with the options in parameter in the trip directory, returning wall time, peak memory (None when
+# not available: it is read through os.wait4, which only exists on Unix systems), exit code and output of the run (also appended to the log file)
+def run_extract(trip_path, args, sink, log_path):
+    command = [sys.executable, "-c", runner_code, str(sink.server_address[1]), script_path] + args
+    with open(log_path, 'a', encoding="utf-8") as log:
+        log_start = log.tell()
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=trip_path, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        peak_rss = None
+        if hasattr(os, "wait4"):
+            pid, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is given in kilobytes on Linux (bytes on macOS), for the largest process of the run (main program or a worker process)
+            peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            process.wait()
+        wall = time.perf_counter() - start
+    with open(log_path, encoding="utf-8", errors="replace") as log:
+        log.seek(log_start)
+        output = log.read()
+    return wall, peak_rss, process.returncode, output
+
+
+# Function to return why the run in parameter failed, or None if it succeeded (extract.py prints its usage and exits with code 0
+# when an option is not supported, for example by older versions)
+def run_error(returncode, output, output_files, emails=None):
+    if returncode != 0:
+        return f"exit code {returncode}"
+    if "anything else will display this help" in output:
+        return "options not supported"
+    if output_files == 0 or emails == 0:
+        return "no output generated"
+    return None
+
+
+# Function to return the number and size of files generated by extract.py in the trip directory in parameter
+def count_outputs(trip_path):
+    count = 0
+    size = 0
+    for root, dirs, files in os.walk(os.path.join(trip_path, "Extracts")):
+        count += len(files)
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return count, size
+
+
+# Function to run the benchmark in the directory in parameter, returning the results
+def benchmark(work_path):
+    print(f"Generating trip ({steps} steps, {photos} photo(s) and {videos} video(s) per step, {photo_width}x{photo_height} photos, {locations} locations)...")
+    trip_path = os.path.join(work_path, "trip")
+    start = time.perf_counter()
+    media_count = generate_trip(trip_path)
+    print(f"Trip generated in {round(time.perf_counter() - start, 2)}s.")
+    global extra_args
+    with open(script_path, 'rb') as f_in:
+        script = f_in.read()
+    script_hash = hashlib.sha1(script).hexdigest()
+    if extra_args is None:  # maps are generated without network by versions of the script which can do it
+        extra_args = ["-t", "none"] if b'"-tiles"' in script else []
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(script_path), capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):  # script not in a git repository
+        commit = None
+    results = {"date": datetime.datetime.now().isoformat(timespec="seconds"), "script": script_path, "script_sha1": script_hash, "commit": commit,
+               "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+               "trip": {"steps": steps, "photos_per_step": photos, "videos_per_step": videos, "photo_width": photo_width,
+                        "photo_height": photo_height, "locations": locations, "media_files": media_count},
+               "extra_args": extra_args, "runs": []}
+    sink = SmtpSink()
+    for mode in modes:
+        # each mode runs on its own copy of the trip, so that the first run does not reuse files generated by other modes
+        mode_path = os.path.join(work_path, mode.strip("-"))
+        shutil.copytree(trip_path, mode_path)
+        args = (["-e", "benchmark@localhost"] if mode == "-e" else [mode]) + extra_args
+        for run in range(runs):
+            messages = sink.messages
+            wall, peak_rss, returncode, output = run_extract(mode_path, args, sink, os.path.join(work_path, f"{mode.strip('-')}.log"))
+            output_files, output_size = count_outputs(mode_path)
+            result = {"mode": mode, "run": run + 1, "args": args, "wall_s": round(wall, 3),
+                      "peak_rss_mb": round(peak_rss / 1024 / 1024, 1) if peak_rss is not None else None,
+                      "files_per_s": round(media_count / wall, 1), "output_files": output_files, "output_mb": round(output_size / 1024 / 1024, 1),
+                      "returncode": returncode}
+            if mode == "-e":
+                result["emails"] = sink.messages - messages
+            result["error"] = run_error(returncode, output, output_files, result.get("emails"))
+            results["runs"].append(result)
+            peak = f"{result['peak_rss_mb']}Mb peak RSS" if peak_rss is not None else "peak RSS not available"
+            print(f"{mode} run {run+1}: {result['wall_s']}s, {peak}, {result['files_per_s']} files/s"
+                  + (f" (! failed: {result['error']}, see {mode.strip('-')}.log)" if result["error"] is not None else ""))
+    sink.shutdown()
+    return results
+
+
+# Function to display instructions to use the benchmark
+def printInstructions():
+    print("""
+Usage: python3 benchmark.py [options]
+The program generates a synthetic Polarsteps trip, runs extract.py on it for each output mode and writes timings in JSON.
+
+Here are the options that could be combined:
+-s, -steps N :                  to generate N steps (default 50)
+-p, -photos N :                 to generate N photos per step (default 5)
+-v, -videos N :                 to generate N videos per step with ffmpeg (default 0)
+-r, -resolution WxH :           to generate photos of W by H pixels (default 1600x1200)
+-n, -locations N :              to generate N tracked locations (default 5000)
+-m, -modes list :               to measure the given comma separated output modes among v, l and e (default v,l,e)
+-a, -args "options" :           to give these options to every run of extract.py (default "-t none", maps without network, if the script has this option)
+-c, -count N :                  to run each mode N times (next runs reuse files generated by the first one)
+-x, -script path :              to measure another version of extract.py
+-o, -output file.json :         to write results in the given file (printed otherwise)
+-k, -keep directory :           to keep the generated trip and outputs in the given directory
+anything else will display this help
+""")
+
+
+# Main program
+if __name__ == "__main__":
+    print(f"=== Benchmark of Polarsteps data extraction ===")
+    args_nb = len(sys.argv)
+    args_index = 1
+    while args_index <= args_nb-1:
+        strParam = sys.argv[args_index]
+        value = sys.argv[args_index+1] if args_index+1 <= args_nb-1 else ""
+        args_index = args_index + 1
+        if strParam in ("-steps", "-s", "-photos", "-p", "-videos", "-v", "-locations", "-n", "-count", "-c") and value.isdigit():
+            number = int(value)
+            if strParam in ("-steps", "-s") and number > 0:
+                steps = number
+            elif strParam in ("-photos", "-p"):
+                photos = number
+            elif strParam in ("-videos", "-v"):
+                videos = number
+            elif strParam in ("-locations", "-n") and number > 1:
+                locations = number
+            elif strParam in ("-count", "-c") and number > 0:
+                runs = number
+            else:
+                print(f"! Invalid value for {strParam}")
+                printInstructions()
+                exit()
+        elif (strParam == "-resolution" or strParam == "-r") and value.count("x") == 1 and value.replace("x", "").isdigit():
+            photo_width, photo_height = (int(size) for size in value.split("x"))
+        elif (strParam == "-modes" or strParam == "-m") and value and set(value.split(",")) <= {"v", "l", "e"}:
+            modes = [f"-{mode}" for mode in value.split(",")]
+        elif (strParam == "-args" or strParam == "-a") and args_index <= args_nb-1:
+            extra_args = value.split()
+        elif (strParam == "-script" or strParam == "-x") and os.path.isfile(value):
+            script_path = os.path.abspath(value)
+        elif (strParam == "-output" or strParam == "-o") and value:
+            output_path = value
+        elif (strParam == "-keep" or strParam == "-k") and value and not os.path.exists(value):
+            keep_path = os.path.abspath(value)
+        else:
+            print(f"! '{strParam}' is not an admitted parameter or has an invalid value.")
+            printInstructions()
+            exit()
+        args_index = args_index + 1
+    if Image is None:
+        print("! pillow is needed to generate photos of the trip (pip install pillow).")
+        exit()
+    work_path = keep_path or tempfile.mkdtemp(prefix="ps_benchmark_")
+    try:
+        results = benchmark(work_path)
+    finally:
+        if keep_path is None:
+            shutil.rmtree(work_path, ignore_errors=True)
+    text = json.dumps(results, indent=2)
+    if output_path is not None:
+        with open(output_path, 'w', encoding="utf-8") as f_out:
+            f_out.write(text + "\n")
+        print(f"Results written in {output_path}.")
+    else:
+        print(text)
@@ -0,0 +1 @@
+searchShard("3034", {"04":[0,1,1]});
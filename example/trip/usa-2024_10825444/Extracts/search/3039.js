@@ -0,0 +1 @@
+searchShard("3039", {"09":[0]});
@@ -0,0 +1 @@
+searchShard("3130", {"10":[1,1]});
@@ -0,0 +1 @@
+searchShard("3230", {"2024":[0,1,1]});
@@ -0,0 +1 @@
+searchShard("616e", {"and":[2]});
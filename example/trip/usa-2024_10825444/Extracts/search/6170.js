@@ -0,0 +1 @@
+searchShard("6170", {"april":[0,1,1]});
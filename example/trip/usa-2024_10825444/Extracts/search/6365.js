@@ -0,0 +1 @@
+searchShard("6365", {"center":[2]});
@@ -0,0 +1 @@
+searchShard("6469", {"discovery":[2]});
@@ -0,0 +1 @@
+searchShard("6563", {"eclipse":[0]});
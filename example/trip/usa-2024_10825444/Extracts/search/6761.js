@@ -0,0 +1 @@
+searchShard("6761", {"galveston":[2]});
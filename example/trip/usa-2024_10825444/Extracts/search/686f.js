@@ -0,0 +1 @@
+searchShard("686f", {"houston":[1,1]});
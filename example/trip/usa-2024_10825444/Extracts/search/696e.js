@@ -0,0 +1 @@
+searchShard("696e", {"in":[1]});
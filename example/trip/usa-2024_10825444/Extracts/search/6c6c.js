@@ -0,0 +1 @@
+searchShard("6c6c", {"llano":[0]});
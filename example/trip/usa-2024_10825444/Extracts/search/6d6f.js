@@ -0,0 +1 @@
+searchShard("6d6f", {"more":[2]});
@@ -0,0 +1 @@
+searchShard("7261", {"rain":[1]});
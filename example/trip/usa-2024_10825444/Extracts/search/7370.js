@@ -0,0 +1 @@
+searchShard("7370", {"space":[2]});
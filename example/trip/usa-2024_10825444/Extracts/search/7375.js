@@ -0,0 +1 @@
+searchShard("7375", {"sun":[0]});
@@ -0,0 +1 @@
+searchShard("7465", {"texas":[0,1,1]});
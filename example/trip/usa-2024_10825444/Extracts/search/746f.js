@@ -0,0 +1 @@
+searchShard("746f", {"total":[0]});
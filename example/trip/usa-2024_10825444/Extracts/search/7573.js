@@ -0,0 +1 @@
+searchShard("7573", {"usa":[0,1,1]});
@@ -0,0 +1 @@
+searchShard("7765", {"webster":[2]});
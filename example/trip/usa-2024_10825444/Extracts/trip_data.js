@@ -0,0 +1,28 @@
+var tripData = {"steps": [{"id": 98177523, "name": "Total eclipse", "date": "2024-04-09"}, {"id": 98394489, "name": "Houston", "date": "2024-04-10"}, {"id": 98534920, "name": "Houston Space Center and Galveston", "date": "2024-04-10"}], "stepsLine": "{c|jy@h_mg{Dffqr@g~sjEde}K{hcM", "route": [[5, "m~vcy@~alg{DiadF~NumLkiOxAl@uG{Agv@xfKdhrJhhcA~|~FdrkE`i_@h}v@jkXhrAjn|PrrqAjvqNpqxGpqzRnoqBrtfHhfa@frw`@r`{AtuDmwAxBpCkeGkgC}{iMcnlCmd~Jwu_JktjHwvbMkfpGosfJue_@snp@{w@xpMgMvkI`dAkhFdwBwcIq_gJctxc@siwAwisPus`@sxyPafn@qwmPzc@euEut@qa{ElyDsrdJs`DieqEpzeHkv~e@noRcjbIalyJuwoS_gX_|cBgk^i`BmsJi~x@nlEw{a@}aDciMp~C|cObbvBkl}Cfv{@edx@zroFi{mFs|GogAaxD}{Lc}Cwf}@faG`aCpq_Hy_eCzpkC{ajDrr@ebUltfA}qkB{pCo_|Cw}FrtC_~Hscn@rw`BpauC`apEbr~Ilm_Cn~bE"]]};
+
+function decodePolyline(text) {
+    var coords = [], index = 0, lat = 0, lon = 0;
+    while (index < text.length) {
+        var values = [0, 0];
+        for (var k = 0; k < 2; k++) {
+            var shift = 0, result = 0, code;
+            do {
+                code = text.charCodeAt(index++) - 63;
+                result |= (code & 0x1f) << shift;
+                shift += 5;
+            } while (code >= 0x20);
+            values[k] = (result & 1) ? ~(result >> 1) : (result >> 1);
+        }
+        lat += values[0];
+        lon += values[1];
+        coords.push([lat / 1e6, lon / 1e6]);
+    }
+    return coords;
+}
+var tripSteps = decodePolyline(tripData.stepsLine).map(function(coords, index) {
+    var step = tripData.steps[index];
+    return {lat: coords[0], lon: coords[1], name: step.name, date: step.date, id: step.id};
+});
+var tripRouteLevels = tripData.route.map(function(level) {
+    return [level[0], decodePolyline(level[1])];
+});
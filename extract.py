@@ -20,19 +20,59 @@ import datetime
 from dateutil import tz
 import json
 import smtplib
+import time
+import collections
+import contextlib
+import threading
+import concurrent.futures
+import io
+import html
+import traceback
+import hashlib
+import base64
 import mimetypes
 from pathlib import Path
 from email.message import EmailMessage
-from email.utils import formatdate
+from email.utils import formatdate, getaddresses
+from email.parser import BytesParser
+from email import policy
+import queue
 import re
+import math
+import bisect
+import struct
+import shutil
+import subprocess
+import string
+import itertools
+import cProfile
+import zipfile
+import tempfile
+import sqlite3
+import unicodedata
+from array import array
+try:  # if ijson is not available, locations are streamed with a slower parser based on json module
+    import ijson
+except ImportError:
+    ijson = None
+try:  # if numpy is not available, locations are sorted with pure python
+    import numpy
+except ImportError:
+    numpy = None
+try:  # if pillow is not available photos are not resized and html pages display original photos
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
 try:  # if error while importing graphic library then map generation is disabled
-    from PIL import Image
-    import cairo
     import staticmaps
-    gen_map = True
+    gen_map = Image is not None
 except:
     gen_map = False
     print("! Map generation module not available.")
+try:  # if cairo is not available maps are rendered with pillow (without anti-aliasing)
+    import cairo
+except ImportError:
+    cairo = None
 
 # if these global email parameters are not set in the script they will be asked interactively when trying to send an email
 dest_email = ''
@@ -41,10 +81,40 @@ mail_serv = 'smtp.gmail.com'  # you can change for any other email provider serv
 mail_port = 465  # change for smtp port your server expect to be called on
 mail_login = ''  # put here your email login
 mail_passwd = ''  # put here your password - for gmail should be an App password (16 letters)
+mail_rate = 0  # maximum number of emails sent per minute, to stay under your provider limits (0 for no limit)
+mail_size = 20  # maximum size (in Mb) of each email once encoded, photos are compressed and larger steps sent in several emails (0 for no limit)
+mail_retries = 3  # number of new attempts (after 5s, 10s, 20s...) when an email could not be sent because of a temporary failure
+mail_queue = 2  # maximum number of emails waiting to be sent in background while next steps are prepared
+mail_sender = None  # SMTP session shared by all emails sent during the run
 
 # other global parameters
 extract_dir = "Extracts"
+trip_file = 'trip.json'  # json files names used by PS
+map_file = 'locations.json'
 no_location = True  # suppose there are no locations until json is parsed
+workers = 1  # number of processes used to process photos
+photo_height = 800  # maximum height (in pixels) of photos sent by email, taller photos are resized
+photo_quality = 75  # JPEG quality (1 to 95) of resized photos, lower values give smaller emails
+cache_size = 500  # maximum size (in Mb) of resized photos kept in Extracts/cache to be reused by next runs (0 to disable)
+cache_stats = False
+profile = False  # to display progress and write Extracts/profile.json report
+profile_stats = False  # to also write Extracts/profile.pstats (cProfile statistics of the main thread)
+media_cache = None  # cache of resized photos used during the run
+route_tolerance = 5  # maximum distance (in meters) between the route displayed in index.htm and tracked locations (0 to keep all locations)
+route_points = 0  # maximum number of locations of the route displayed in index.htm (0 for no limit)
+map_tiles = ""  # directory of map tiles ({zoom}/{x}/{y}.png files) to generate maps without network, or "none" to generate maps without background
+tiles_cache = ""  # directory where downloaded map tiles are kept to be reused by next runs ("" for Extracts/tiles)
+thumb_height = 360  # height (in pixels) of photo thumbnails and video posters of html pages (displayed 180 pixels high, sharp on high density screens)
+screen_size = 1600  # maximum width and height (in pixels) of photos displayed in html pages galleries
+ffmpeg_path = shutil.which("ffmpeg")  # used to extract poster frames of videos, videos are displayed without poster if not found
+video_height = 720  # maximum height (in pixels) of videos transcoded with the convert option
+video_quality = 28  # quality of transcoded videos (H.264 CRF, from 18 to 35), higher values give smaller videos
+stop_radius = 200  # maximum distance (in meters) between consecutive locations of a stop in route analytics
+stop_duration = 15  # minimum duration (in minutes) of a stop in route analytics
+index_page_size = 50  # number of steps listed in each page of index.htm (0 to list all steps in one page)
+stage_times = collections.defaultdict(float)  # time spent (in seconds) in each stage of the run
+stage_counts = collections.defaultdict(int)  # counters of the run (steps, photos, bytes read...) reported with the profile option
+stage_lock = threading.Lock()  # stages and counters are updated by the threads of outputs and the email thread
 
 # set all specific run modes of the script to False; should be modified through launching args
 mail = False
@@ -52,89 +122,15 @@ local = False
 interactive = False
 verbose = False
 exclude = False
+force = False
+json_output = False
+transcode = False
+database = ""  # SQLite database where steps, media and locations of extracted trips are indexed ("" to disable)
+batch_path = None  # directory of a whole Polarsteps export when all its trips should be extracted
 
 
-# Function to generate map using tile name in parameter (allowed tiles by staticmaps listed below)
-if gen_map:
-    def tile(style=staticmaps.tile_provider_OSM):
-        map = staticmaps.Context()
-        map.set_tile_provider(style)
-        # staticmaps.tile_provider_OSM,
-        # staticmaps.tile_provider_ArcGISWorldImagery,
-        # staticmaps.tile_provider_CartoNoLabels,
-        # staticmaps.tile_provider_CartoDarkNoLabels,
-        # staticmaps.tile_provider_None,
-        # not working#staticmaps.tile_provider_StamenTerrain,
-        # not working#staticmaps.tile_provider_StamenToner,
-        # not working#staticmaps.tile_provider_StamenTonerLite,
-        return map
-
-
-# Function to send email message in parameter
-def email(msg):
-    # get global parameters
-    global dest_email
-    global orig_email
-    global mail_serv
-    global mail_port
-    global mail_login
-    global mail_passwd
-    # ask for undefined parameters
-    if dest_email == "":
-        dest_email = input("--> Input destination address where emails should be sent (i.e. myblog.mywp.com): ")
-    if orig_email == "":
-        orig_email = input("--> Input email address you want to appear in sent emails (i.e. myaddress.myisp.com): ")
-    if mail_serv == "":
-        mail_serv = input("--> Input email server that should be used to send emails (i.e. smtp.myisp.com): ")
-    if mail_port == "":
-        mail_port = input("--> Input email server port that should be used to send emails (i.e. 465 or 587 or 25): ")
-    if mail_login == "":
-        mail_login = input("--> Input email login that should be used to send emails (i.e. myname@myisp.com): ")
-    if mail_passwd == "":
-        mail_passwd = input("-->Input email password that should be used to send emails: ")
-    if msg['From'] is None:
-        msg['From'] = orig_email
-    if msg['To'] is None:
-        msg['To'] = ', '.join([dest_email])
-    try:
-        # use SSL connection; for gmail ensure that you use an App password and not your regular password
-        mail_server = smtplib.SMTP_SSL(mail_serv, mail_port)
-        mail_server.ehlo()
-        mail_server.login(mail_login, mail_passwd)
-        mail_server.send_message(msg)
-        print(f"Email {msg['Subject']} sent to {dest_email}.\n")
-        mail_server.quit()
-    except smtplib.SMTPException as e:
-        print(e)
-    return
-
-
-# Function to parse data and generate different items depending on options selected
-def parse_data(data, original_path, extract_dir, loc_data=None):
-
-    # Function to return last modification time of the file in parameter
-    def get_modif_time(entry):
-        return entry.stat().st_mtime
-
-    # get global parameters
-    global mail
-    global local
-    global interactive
-    global verbose
-    global exclude
-    global no_location
-    # define table to use special UTF-8 characters (emoticon) to weather conditions and countries
-    weather_dict = {"rain": "\U0001F327", "clear-day": "\U0001F506", "partly-cloudy-day": "\U000026C5",
-                    "snow": "\U000026C4", "cloudy": "\U00002601"}
-    country_dict = { #these countries denominations have been tested as used by PS in 2024/07
-"Andorra":"\U0001F1E6\U0001F1E9","United Arab Emirates":"\U0001F1E6\U0001F1EA","Afghanistan":"\U0001F1E6\U0001F1EB","Antigua and Barbuda":"\U0001F1E6\U0001F1EC","Anguilla":"\U0001F1E6\U0001F1EE","Albania":"\U0001F1E6\U0001F1F1","Armenia":"\U0001F1E6\U0001F1F2","Angola":"\U0001F1E6\U0001F1F4","Antarctica":"\U0001F1E6\U0001F1F6","Argentina":"\U0001F1E6\U0001F1F7","Austria":"\U0001F1E6\U0001F1F9","Australia":"\U0001F1E6\U0001F1FA","Azerbaijan":"\U0001F1E6\U0001F1FF","Bosnia and Herzegovina":"\U0001F1E7\U0001F1E6","Barbados":"\U0001F1E7\U0001F1E7","Bangladesh":"\U0001F1E7\U0001F1E9","Belgium":"\U0001F1E7\U0001F1EA","Burkina Faso":"\U0001F1E7\U0001F1EB","Bulgaria":"\U0001F1E7\U0001F1EC","Bahrain":"\U0001F1E7\U0001F1ED","Burundi":"\U0001F1E7\U0001F1EE","Benin":"\U0001F1E7\U0001F1EF","Saint Barthelemy":"\U0001F1E7\U0001F1F1","Bermuda":"\U0001F1E7\U0001F1F2","Brunei":"\U0001F1E7\U0001F1F3","Bolivia":"\U0001F1E7\U0001F1F4","Brazil":"\U0001F1E7\U0001F1F7","Bahamas":"\U0001F1E7\U0001F1F8","Bhutan":"\U0001F1E7\U0001F1F9","Botswana":"\U0001F1E7\U0001F1FC","Belarus":"\U0001F1E7\U0001F1FE","Belize":"\U0001F1E7\U0001F1FF","Canada":"\U0001F1E8\U0001F1E6","Democratic Republic of the Congo":"\U0001F1E8\U0001F1E9","Central African Republic":"\U0001F1E8\U0001F1EB","Congo":"\U0001F1E8\U0001F1EC","Switzerland":"\U0001F1E8\U0001F1ED","Côte d'Ivoire":"\U0001F1E8\U0001F1EE","Cook Islands":"\U0001F1E8\U0001F1F0","Chile":"\U0001F1E8\U0001F1F1","Cameroon":"\U0001F1E8\U0001F1F2","China":"\U0001F1E8\U0001F1F3","Colombia":"\U0001F1E8\U0001F1F4","Costa Rica":"\U0001F1E8\U0001F1F7","Cuba":"\U0001F1E8\U0001F1FA","Cape Verde":"\U0001F1E8\U0001F1FB","Curacao":"\U0001F1E8\U0001F1FC","Cyprus":"\U0001F1E8\U0001F1FE","Czechia":"\U0001F1E8\U0001F1FF","Germany":"\U0001F1E9\U0001F1EA","Djibouti":"\U0001F1E9\U0001F1EF","Denmark":"\U0001F1E9\U0001F1F0","Dominica":"\U0001F1E9\U0001F1F2","Dominican Republic":"\U0001F1E9\U0001F1F4","Algeria":"\U0001F1E9\U0001F1FF","Ecuador":"\U0001F1EA\U0001F1E8","Estonia":"\U0001F1EA\U0001F1EA","Egypt":"\U0001F1EA\U0001F1EC","Sahrawi Arab Democratic Republic":"\U0001F1EA\U0001F1ED","Eritrea":"\U0001F1EA\U0001F1F7","Spain":"\U0001F1EA\U0001F1F8","Ethiopia":"\U0001F1EA\U0001F1F9","Finland":"\U0001F1EB\U0001F1EE","Fiji":"\U0001F1EB\U0001F1EF","Falkland Islands":"\U0001F1EB\U0001F1F0","Federated States of Micronesia":"\U0001F1EB\U0001F1F2","Faroe Islands":"\U0001F1EB\U0001F1F4","France":"\U0001F1EB\U0001F1F7","Gabon":"\U0001F1EC\U0001F1E6","United Kingdom":"\U0001F1EC\U0001F1E7","Grenada":"\U0001F1EC\U0001F1E9","Georgia":"\U0001F1EC\U0001F1EA","Guernsey":"\U0001F1EC\U0001F1EC","Ghana":"\U0001F1EC\U0001F1ED","Gibraltar":"\U0001F1EC\U0001F1EE","Greenland":"\U0001F1EC\U0001F1F1","The Gambia":"\U0001F1EC\U0001F1F2","Guinea":"\U0001F1EC\U0001F1F3","Equatorial Guinea":"\U0001F1EC\U0001F1F6","Greece":"\U0001F1EC\U0001F1F7","South Georgia and the South Sandwich Islands":"\U0001F1EC\U0001F1F8","Guatemala":"\U0001F1EC\U0001F1F9","Guinea-Bissau":"\U0001F1EC\U0001F1FC","Guyana":"\U0001F1EC\U0001F1FE","Hong Kong":"\U0001F1ED\U0001F1F0","Honduras":"\U0001F1ED\U0001F1F3","Croatia":"\U0001F1ED\U0001F1F7","Haiti":"\U0001F1ED\U0001F1F9","Hungary":"\U0001F1ED\U0001F1FA","Indonesia":"\U0001F1EE\U0001F1E9","Ireland":"\U0001F1EE\U0001F1EA","Israel":"\U0001F1EE\U0001F1F1","Isle of Man":"\U0001F1EE\U0001F1F2","India":"\U0001F1EE\U0001F1F3","British Indian Ocean Territory":"\U0001F1EE\U0001F1F4","Iraq":"\U0001F1EE\U0001F1F6","Iran":"\U0001F1EE\U0001F1F7","Iceland":"\U0001F1EE\U0001F1F8","Italy":"\U0001F1EE\U0001F1F9","Jersey":"\U0001F1EF\U0001F1EA","Jamaica":"\U0001F1EF\U0001F1F2","Jordan":"\U0001F1EF\U0001F1F4","Japan":"\U0001F1EF\U0001F1F5","Kenya":"\U0001F1F0\U0001F1EA","Kyrgyzstan":"\U0001F1F0\U0001F1EC","Cambodia":"\U0001F1F0\U0001F1ED","Kiribati":"\U0001F1F0\U0001F1EE","Comoros":"\U0001F1F0\U0001F1F2","Saint Kitts and Nevis":"\U0001F1F0\U0001F1F3","North Korea":"\U0001F1F0\U0001F1F5","South Korea":"\U0001F1F0\U0001F1F7","Kuwait":"\U0001F1F0\U0001F1FC","Cayman Islands":"\U0001F1F0\U0001F1FE","Kazakhstan":"\U0001F1F0\U0001F1FF","Laos":"\U0001F1F1\U0001F1E6","Lebanon":"\U0001F1F1\U0001F1E7","Saint Lucia":"\U0001F1F1\U0001F1E8","Liechtenstein":"\U0001F1F1\U0001F1EE","Sri Lanka":"\U0001F1F1\U0001F1F0","Liberia":"\U0001F1F1\U0001F1F7","Lesotho":"\U0001F1F1\U0001F1F8","Lithuania":"\U0001F1F1\U0001F1F9","Luxembourg":"\U0001F1F1\U0001F1FA","Latvia":"\U0001F1F1\U0001F1FB","Libya":"\U0001F1F1\U0001F1FE","Morocco":"\U0001F1F2\U0001F1E6","Monaco":"\U0001F1F2\U0001F1E8","Moldova":"\U0001F1F2\U0001F1E9","Montenegro":"\U0001F1F2\U0001F1EA","Saint Martin":"\U0001F1F2\U0001F1EB","Madagascar":"\U0001F1F2\U0001F1EC","Marshall Islands":"\U0001F1F2\U0001F1ED","North Macedonia":"\U0001F1F2\U0001F1F0","Mali":"\U0001F1F2\U0001F1F1","Myanmar":"\U0001F1F2\U0001F1F2","Mongolia":"\U0001F1F2\U0001F1F3","Mauritania":"\U0001F1F2\U0001F1F7","Montserrat":"\U0001F1F2\U0001F1F8","Malta":"\U0001F1F2\U0001F1F9","Mauritius":"\U0001F1F2\U0001F1FA","Maldives":"\U0001F1F2\U0001F1FB","Malawi":"\U0001F1F2\U0001F1FC","Mexico":"\U0001F1F2\U0001F1FD","Malaysia":"\U0001F1F2\U0001F1FE","Mozambique":"\U0001F1F2\U0001F1FF","Namibia":"\U0001F1F3\U0001F1E6","New Caledonia":"\U0001F1F3\U0001F1E8","Niger":"\U0001F1F3\U0001F1EA","Norfolk Island":"\U0001F1F3\U0001F1EB","Nigeria":"\U0001F1F3\U0001F1EC","Nicaragua":"\U0001F1F3\U0001F1EE","Netherlands":"\U0001F1F3\U0001F1F1","Norway":"\U0001F1F3\U0001F1F4","Nepal":"\U0001F1F3\U0001F1F5","Nauru":"\U0001F1F3\U0001F1F7","Niue":"\U0001F1F3\U0001F1FA","New Zealand":"\U0001F1F3\U0001F1FF","Oman":"\U0001F1F4\U0001F1F2","Panama":"\U0001F1F5\U0001F1E6","Peru":"\U0001F1F5\U0001F1EA","Papua New Guinea":"\U0001F1F5\U0001F1EC","Philippines":"\U0001F1F5\U0001F1ED","Pakistan":"\U0001F1F5\U0001F1F0","Poland":"\U0001F1F5\U0001F1F1","Pitcairn Islands":"\U0001F1F5\U0001F1F3","Puerto Rico":"\U0001F1F5\U0001F1F7","Palestinian Territory":"\U0001F1F5\U0001F1F8","Portugal":"\U0001F1F5\U0001F1F9","Palau":"\U0001F1F5\U0001F1FC","Paraguay":"\U0001F1F5\U0001F1FE","Qatar":"\U0001F1F6\U0001F1E6","Romania":"\U0001F1F7\U0001F1F4","Serbia":"\U0001F1F7\U0001F1F8","Russia":"\U0001F1F7\U0001F1FA","Rwanda":"\U0001F1F7\U0001F1FC","Saudi Arabia":"\U0001F1F8\U0001F1E6","Solomon Islands":"\U0001F1F8\U0001F1E7","Seychelles":"\U0001F1F8\U0001F1E8","Sudan":"\U0001F1F8\U0001F1E9","Sweden":"\U0001F1F8\U0001F1EA","Singapore":"\U0001F1F8\U0001F1EC","Saint Helena, Ascension and Tristan da Cunha":"\U0001F1F8\U0001F1ED","Slovenia":"\U0001F1F8\U0001F1EE","Slovakia":"\U0001F1F8\U0001F1F0","Sierra Leone":"\U0001F1F8\U0001F1F1","San Marino":"\U0001F1F8\U0001F1F2","Senegal":"\U0001F1F8\U0001F1F3","Somalia":"\U0001F1F8\U0001F1F4","Suriname":"\U0001F1F8\U0001F1F7","South Sudan":"\U0001F1F8\U0001F1F8","São Tomé and Príncipe":"\U0001F1F8\U0001F1F9","El Salvador":"\U0001F1F8\U0001F1FB","Sint Maarten":"\U0001F1F8\U0001F1FD","Syria":"\U0001F1F8\U0001F1FE","eSwatini":"\U0001F1F8\U0001F1FF","Turks and Caicos Islands":"\U0001F1F9\U0001F1E8","Chad":"\U0001F1F9\U0001F1E9","French Southern and Antarctic Lands":"\U0001F1F9\U0001F1EB","Togo":"\U0001F1F9\U0001F1EC","Thailand":"\U0001F1F9\U0001F1ED","Tajikistan":"\U0001F1F9\U0001F1EF","Tokelau":"\U0001F1F9\U0001F1F0","East Timor":"\U0001F1F9\U0001F1F1","Turkmenistan":"\U0001F1F9\U0001F1F2","Tunisia":"\U0001F1F9\U0001F1F3","Tonga":"\U0001F1F9\U0001F1F4","Turkey":"\U0001F1F9\U0001F1F7","Trinidad and Tobago":"\U0001F1F9\U0001F1F9","Tuvalu":"\U0001F1F9\U0001F1FB","Taiwan":"\U0001F1F9\U0001F1FC","Tanzania":"\U0001F1F9\U0001F1FF","Ukraine":"\U0001F1FA\U0001F1E6","Uganda":"\U0001F1FA\U0001F1EC","USA":"\U0001F1FA\U0001F1F8","Uruguay":"\U0001F1FA\U0001F1FE","Uzbekistan":"\U0001F1FA\U0001F1FF","Vatican City":"\U0001F1FB\U0001F1E6","Saint Vincent and the Grenadines":"\U0001F1FB\U0001F1E8","Venezuela":"\U0001F1FB\U0001F1EA","British Virgin Islands":"\U0001F1FB\U0001F1EC","US Virgin Islands":"\U0001F1FB\U0001F1EE","Vietnam":"\U0001F1FB\U0001F1F3","Vanuatu":"\U0001F1FB\U0001F1FA","Samoa":"\U0001F1FC\U0001F1F8","Kosovo":"\U0001F1FD\U0001F1F0","Yemen":"\U0001F1FE\U0001F1EA","South Africa":"\U0001F1FF\U0001F1E6","Zambia":"\U0001F1FF\U0001F1F2","Zimbabwe":"\U0001F1FF\U0001F1FC",
-# additional denominations not identified as used by PS
-"American Samoa":"\U0001F1E6\U0001F1F8","Aruba":"\U0001F1E6\U0001F1FC","Åland Islands":"\U0001F1E6\U0001F1FD","Bonaire, Sint Eustatius and Saba":"\U0001F1E7\U0001F1F6","Bouvet Island":"\U0001F1E7\U0001F1FB","Cocos (Keeling) Islands":"\U0001F1E8\U0001F1E8","Christmas Island":"\U0001F1E8\U0001F1FD","French Guiana":"\U0001F1EC\U0001F1EB","Guadeloupe":"\U0001F1EC\U0001F1F5","Guam":"\U0001F1EC\U0001F1FA","Heard Island and Mcdonald Islands":"\U0001F1ED\U0001F1F2","Macao":"\U0001F1F2\U0001F1F4","Northern Mariana Islands":"\U0001F1F2\U0001F1F5","Martinique":"\U0001F1F2\U0001F1F6","French Polynesia":"\U0001F1F5\U0001F1EB","Saint Pierre and Miquelon":"\U0001F1F5\U0001F1F2","Réunion":"\U0001F1F7\U0001F1EA","Svalbard and Jan Mayen":"\U0001F1F8\U0001F1EF","United States Minor Outlying Islands":"\U0001F1FA\U0001F1F2","Wallis and Futuna":"\U0001F1FC\U0001F1EB","Mayotte":"\U0001F1FE\U0001F1F9"}
-    
-  
-
-    # define CSS file that will be created for local html generation
-    css_text = """
+# define CSS file that will be created for local html generation
+css_text = """
     html, body {
         font-family: arial;
         padding: 0 2em;
@@ -273,6 +269,10 @@ def parse_data(data, original_path, extract_dir, loc_data=None):
         background-color: #740404;
     }
 
+    .pages a, .pages b {
+        margin: 0 0.3em;
+    }
+
     /* Styles for numbered circular markers */
     .numbered-marker .marker-circle {
         width: 30px;
@@ -286,360 +286,2674 @@ def parse_data(data, original_path, extract_dir, loc_data=None):
         font-size: 16px;
         border: 2px solid white;
     }
+
+    .other-page .marker-circle {
+        background-color: #777;
+        opacity: 0.7;
+    }
     """
 
-    # get general information about the trip
-    trip_name = data['name'].strip()
-    trip_summary = data['summary']
-    trip_start_date = datetime.datetime.fromtimestamp(data['start_date']).strftime('%Y-%m-%d')
-    if data['end_date'] is not None:
-        trip_end_date = datetime.datetime.fromtimestamp(data['end_date']).strftime('%Y-%m-%d')
-    else:
-        trip_end_date = "?"
-    total_distance = data['total_km']
-    if data['travel_tracker_device'] is not None:
-        phone_type = data['travel_tracker_device']['device_name']
-    else:
-        phone_type = "?"
-    timezone_id = data['timezone_id']
-    total_entries = data['step_count']
-
-    # initialize global map
-    if gen_map:
-        global_map = tile(staticmaps.tile_provider_ArcGISWorldImagery)
-    # create .txt file
-    file_out = os.path.join(extract_dir, f"{trip_name}_{trip_start_date}.txt")
-    with open(file_out, 'w', encoding="utf-8") as f_out:
-        if local:  # create css and index.htm file
-            css_file = open(os.path.join(extract_dir, "local.css"), 'w', encoding="utf-8")
-            css_file.write(css_text)
-            css_file.close()
-            index_file = open(os.path.join(extract_dir, "index.htm"), 'w', encoding="utf-8")
-            index_file.write(f"""<head>
+
+# define javascript code added to trip_data.js file to decode steps and route
+trip_data_js = """
+function decodePolyline(text) {
+    var coords = [], index = 0, lat = 0, lon = 0;
+    while (index < text.length) {
+        var values = [0, 0];
+        for (var k = 0; k < 2; k++) {
+            var shift = 0, result = 0, code;
+            do {
+                code = text.charCodeAt(index++) - 63;
+                result |= (code & 0x1f) << shift;
+                shift += 5;
+            } while (code >= 0x20);
+            values[k] = (result & 1) ? ~(result >> 1) : (result >> 1);
+        }
+        lat += values[0];
+        lon += values[1];
+        coords.push([lat / 1e6, lon / 1e6]);
+    }
+    return coords;
+}
+var tripSteps = decodePolyline(tripData.stepsLine).map(function(coords, index) {
+    var step = tripData.steps[index];
+    return {lat: coords[0], lon: coords[1], name: step.name, date: step.date, id: step.id};
+});
+var tripRouteLevels = tripData.route.map(function(level) {
+    return [level[0], decodePolyline(level[1])];
+});
+"""
+
+# define javascript code of the search box of index.htm: words of the query are searched in shards of the search index
+# (search/{hex of the 2 first letters}.js files), loaded with script tags when needed so that it works without server
+search_js = """
+var searchShards = {};
+function searchShard(key, words) {
+    searchShards[key] = words;
+}
+function searchWords(text) {
+    return text.normalize('NFKD').replace(/\\p{M}/gu, '').toLowerCase().match(/[\\p{L}\\p{N}]+/gu) || [];
+}
+function shardKey(word) {
+    return Array.from(new TextEncoder().encode(Array.from(word).slice(0, 2).join(''))).map(function(byte) {
+        return byte.toString(16).padStart(2, '0');
+    }).join('');
+}
+function loadShard(key, callback) {
+    if (key in searchShards) {
+        callback(searchShards[key]);
+        return;
+    }
+    var script = document.createElement('script');
+    script.src = 'search/' + key + '.js';
+    script.onload = function() { callback(searchShards[key] || {}); };
+    script.onerror = function() { searchShards[key] = {}; callback({}); };
+    document.head.appendChild(script);
+}
+// return numbers of the steps containing a word starting with the query word in parameter (postings are delta encoded)
+function searchWord(word, callback) {
+    loadShard(shardKey(word), function(words) {
+        var numbers = {};
+        Object.keys(words).forEach(function(indexed) {
+            if (indexed.indexOf(word) == 0) {
+                var number = 0;
+                words[indexed].forEach(function(delta) { number += delta; numbers[number] = true; });
+            }
+        });
+        callback(numbers);
+    });
+}
+var searchTimer = null;
+function search(query) {
+    var words = searchWords(query).filter(function(word) { return Array.from(word).length >= 2; });
+    var results = document.getElementById('results');
+    if (words.length == 0) {
+        results.innerHTML = '';
+        return;
+    }
+    var found = [], pending = words.length;
+    words.forEach(function(word, index) {
+        searchWord(word, function(numbers) {
+            found[index] = numbers;
+            if (--pending > 0 || document.getElementById('search').value != query) { return; }
+            var steps = tripData.steps.filter(function(step, number) {
+                return found.every(function(numbers) { return numbers[number]; });
+            });
+            results.innerHTML = steps.length + ' step(s) found<br>' + steps.map(function(step) {
+                var link = document.createElement('a');
+                link.href = step.id + '.htm';
+                link.textContent = step.name;
+                return link.outerHTML + ' <small>' + step.date + '</small>';
+            }).join('<br>');
+        });
+    });
+}
+document.getElementById('search').addEventListener('input', function(event) {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(function() { search(event.target.value); }, 200);
+});
+"""
+
+# define templates of local html pages ($name fields are replaced by values computed for each page)
+html_head = """<head>
     <link rel="stylesheet" type="text/css" href="local.css">
     <link rel="stylesheet" href="https://unpkg.com/leaflet/dist/leaflet.css" />
     </head>
     <body>
     <script src="https://unpkg.com/leaflet/dist/leaflet.js"></script>
-    <h1>{trip_name}</h1>
-    <p id=intro>""")
-            index_file.write(f"{trip_summary}, {round(total_distance)}km, {total_entries} steps, {trip_start_date}-{trip_end_date}\n<br><br>\n")
-            index_file.write(f'<div id="mapid" style="height: 600px;"></div>\n')
-        text = f"Trip Name: {trip_name}\n{trip_summary}\n"
-        text += f"Start Date: {trip_start_date}\nEnd Date: {trip_end_date}\n"
-        text += f"Total Distance: {round(total_distance)}(km) in {total_entries} steps\n"
-        if verbose:
-            text += f"User Timezone: {timezone_id}\nRecording Device: {phone_type}\n"
-        text += "____________________\n"
-        if interactive:
-            print(text)
-        f_out.write(text+"\n")
-        from_zone = tz.gettz('UTC')
-
-        # Initialize step coordinates list for Leaflet map
-        step_coords = []
-
-        # loop on each step of the trip
-        for step_num, entry in enumerate(data['all_steps']):
-            # get step information
-            step_id = entry['id']
-            step_slug = entry['slug']
-            step_name = entry['display_name']
-            to_zone = tz.gettz(timezone_id)
-            # prefer start time of the step than the creation time in PS as the time of the step to be displayed
-            creation_time = datetime.datetime.fromtimestamp(entry['start_time'])
-            creation_time = creation_time.replace(tzinfo=from_zone)
-            adjusted_time = creation_time.astimezone(to_zone)
-            adjusted_date = adjusted_time.strftime('%Y-%m-%d')
-            # get location information
-            location_name = entry['location']['name']
-            location_lat = entry['location']['lat']
-            location_lon = entry['location']['lon']
-            location_country = entry['location']['detail']
-            location_detail = entry['location']['full_detail']
-            # if possible replace location text by corresponding flag
-            if location_country in country_dict:
-                country = country_dict[location_country]
-                if location_detail != location_country:
-                    country = country + " " + location_detail.split(",")[0]
-                # print(f"Flag for country '{location_country}' detected")
-            else:
-                country = location_detail
-                print(f"! Flag for country '{location_country}' not present !")
-            # get weather condition and if possible replace weather text by corresponding emoticon
-            weather_condition = entry['weather_condition']
-            weather = weather_dict[weather_condition] if weather_condition in weather_dict else weather_condition
-            temperature = entry['weather_temperature']
-            # get step description
-            journal = entry['description'] if entry['description'] is not None else ""
-            # generate text for .txt file
-            text = f"Step: {step_name}\n"
-            if verbose:
-                text += f"Step Id: {step_id}, Slug: {step_slug}\n"
-            text += f"Date: {adjusted_time.strftime('%Y-%m-%d %H:%M')}\n"
-            if verbose:
-                text += f"Location: {country} {location_name} ({location_lat},{location_lon} - {location_detail})"
-            text += f"\nWeather: {weather_condition}, Temperature: {temperature}°C\n\n"
-            text += f"{journal}\n\n"
-            if local:  # generate html content
-                index_file.write(f"<h2>{step_name} <small>{adjusted_date}</small></h2><a href=\"{step_id}.htm\">\n")
-                # create step related html file
-                step_file_path = os.path.join(extract_dir, f"{step_id}.htm")
-                step_file = open(step_file_path, 'w', encoding="utf-8")
-                step_file.write(f"""<head>
+    <script src="trip_data.js"></script>
+    <h1>$title</h1>
+    <p id=intro>$intro
+<br><br>
+<div id="mapid" style="height: 600px;"></div>
+"""
+osm_layer = """    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: 'Map data © <a href="https://openstreetmap.org">OpenStreetMap</a> contributors'
+    }).addTo(mymap);
+"""
+html_templates = {name: string.Template(text) for name, text in {
+    'index': html_head + """<p><input id="search" type="search" size="40" placeholder="Search steps (name, description, place, date)"></p>
+<p id="results"></p>
+<script>""" + search_js.replace("$", "$$") + """</script>
+$pages$steps$pages<script>
+    var mymap = L.map('mapid');
+""" + osm_layer + """    var markers = tripSteps;
+    var markerGroup = L.featureGroup();
+    var pageGroup = L.featureGroup();
+    var pageSize = $page_size, currentPage = $page;
+    // markers of steps listed in other pages of index.htm are greyed and link to these pages
+    markers.forEach(function(marker, index) {
+        var number = index + 1;
+        var page = pageSize > 0 ? Math.floor(index / pageSize) : 0;
+        var link = page == currentPage ? marker.id + '.htm' : (page == 0 ? 'index.htm' : 'index_' + (page + 1) + '.htm') + '#s' + marker.id;
+        var myIcon = L.divIcon({
+            className: page == currentPage ? 'numbered-marker' : 'numbered-marker other-page',
+            html: '<div class="marker-circle">' + number + '</div>',
+            iconSize: [30, 30],
+            iconAnchor: [15, 30],
+            popupAnchor: [0, -30]
+        });
+        var m = L.marker([marker.lat, marker.lon], {icon: myIcon});
+        m.bindPopup('<b><a href="' + link + '">' + marker.name + '</a></b><br>' + marker.date);
+        m.on('click', function() {
+            window.location.href = link;
+        });
+        markerGroup.addLayer(m);
+        if (page == currentPage) { pageGroup.addLayer(m); }
+    });
+    markerGroup.addTo(mymap);
+    mymap.fitBounds(pageGroup.getBounds());
+$route</script>
+</p>
+</body>
+""",
+    # steps listed in index.htm
+    'index_step': """<h2 id="s$id">$name <small>$date</small></h2><a href="$id.htm">
+$image</a><br>
+""",
+    # links to the pages of index.htm, with the dates of their steps
+    'index_pages': """<p class="pages">$links</p>
+""",
+    # route displayed in index.htm, using the least detailed route which tolerance is below the size of a pixel at current zoom
+    'route': """    var polyline = L.polyline([], {color: 'blue'}).addTo(mymap);
+    function showRoute() {
+        var pixelMeters = 156543.03 * Math.cos(mymap.getCenter().lat * Math.PI / 180) / Math.pow(2, mymap.getZoom());
+        var level = tripRouteLevels[0];
+        tripRouteLevels.forEach(function(routeLevel) {
+            if (routeLevel[0] <= pixelMeters) { level = routeLevel; }
+        });
+        polyline.setLatLngs(level[1]);
+    }
+    mymap.on('zoomend', showRoute);
+    showRoute();
+""",
+    'step': html_head + """<script>
+    var mymap = L.map('mapid').setView([$lat, $lon], 13);
+""" + osm_layer + """    var marker = tripSteps.filter(function(step) { return step.id == $id; })[0];
+    L.marker([marker.lat, marker.lon]).addTo(mymap)
+        .bindPopup(marker.name + '<br>' + marker.date).openPopup();
+</script>
+$gallery<p class="footer">
+$previous<a href="$index_link">$trip_name</a>$next</p>
+</body>
+""",
+    # photos and videos of step pages, displayed in a gallery
+    'photo': """<a href="#img$number"><img class="thumb" loading="lazy" src="$thumb"></a>
+<div class="lightbox" id="img$number">
+$previous<a href="#_" class="btn-close">X</a>
+<img loading="lazy" src="$screen"$srcset>
+$next</div>
+""",
+    'video': """<a href="#vid$number">$thumb</a>
+<div class="lightbox" id="vid$number">
+$previous<a href="#_" class="btn-close">X</a>
+<video controls$attributes src="$src"></video>
+$next</div>
+""",
+    # index.htm of batch mode, linking all trips of the export
+    'trips': """<head>
     <link rel="stylesheet" type="text/css" href="local.css">
-    <link rel="stylesheet" href="https://unpkg.com/leaflet/dist/leaflet.css" />
     </head>
     <body>
-    <script src="https://unpkg.com/leaflet/dist/leaflet.js"></script>
-    <h1>{step_name}</h1>
-    <p id=intro>{country} {location_name} \U0001F538 {adjusted_date} \U0001F538 {weather}""")
-                if temperature is not None:
-                    step_file.write(f" {int(temperature)}°C")
-                step_file.write(f"\n<br><br>")
-                # Include Leaflet map in step file
-                step_file.write(f'<div id="mapid" style="height: 600px;"></div>\n')
-                step_file.write("<script>\n")
-                step_file.write(f"    var mymap = L.map('mapid').setView([{location_lat}, {location_lon}], 13);\n")
-                step_file.write("    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {\n")
-                step_file.write("        attribution: 'Map data © <a href=\"https://openstreetmap.org\">OpenStreetMap</a> contributors'\n")
-                step_file.write("    }).addTo(mymap);\n")
-                step_info = {
-                    'lat': location_lat,
-                    'lon': location_lon,
-                    'name': step_name.replace("'", "\\'"),
-                    'date': adjusted_date.replace("'", "\\'")
-                }
-                step_file.write("    var marker = ")
-                step_file.write(json.dumps(step_info))
-                step_file.write(";\n")
-                step_file.write("    L.marker([marker.lat, marker.lon]).addTo(mymap)\n")
-                step_file.write("        .bindPopup(marker.name + '<br>' + marker.date).openPopup();\n")
-                step_file.write("</script>\n")
-            # generate email structure
-            msg = EmailMessage()
-            msg['Subject'] = step_name
-            msg["Date"] = adjusted_time
-            mess = f"{country} {location_name} \U0001F538 {weather}"
-            if temperature is not None:
-                mess += f"{int(temperature)}°C"
-            mess += f"\n\n{journal}\n"
-            msg.set_content(mess)
-            # initialize counters before parsing photos and videos related to this step
-            photos_nbr = 0
-            videos_nbr = 0
-            total_size = 0
-            new_total_size = 0
-            step_image = ""
-            # get the list of photos and sort them to try to retrieve PS order
-            path = os.path.join(original_path, f"{step_slug}_{step_id}", "photos")
-            if os.path.isdir(path):
-                with os.scandir(path) as entries:
-                    sorted_entries = sorted(entries, key=get_modif_time)
-                    sorted_photos = [entry.name for entry in sorted_entries]
-                    if "Thumbs.db" in sorted_photos:
-                        sorted_photos.remove("Thumbs.db")
-                    photos_nbr = len(sorted_photos)
-            # get the list of videos and sort them to try to retrieve PS order
-            path = os.path.join(original_path, f"{step_slug}_{step_id}", "videos")
-            if os.path.isdir(path):
-                with os.scandir(path) as entries:
-                    sorted_entries = sorted(entries, key=get_modif_time)
-                    sorted_videos = [entry.name for entry in sorted_entries]
-                    videos_nbr = len(sorted_videos)
-            # parse photos
-            if photos_nbr > 0:
-                for photo, f in enumerate(sorted_photos):
-                    cfile = Path(os.path.join(os.getcwd(), f"{step_slug}_{step_id}", "photos", f))
-                    initial_size = cfile.stat().st_size
-                    if verbose:
-                        text += f"Photo {photo+1}: {f} ({round(initial_size/1024/102.4)/10}Mb"
-                    ctype, encoding = mimetypes.guess_type(cfile)
-                    if ctype is None or encoding is not None:
-                        ctype = 'image/jpeg'
-                    maintype, subtype = ctype.split('/', 1)
-                    total_size = total_size + initial_size
-                    image = Image.open(cfile)
-                    width, height = image.size
-                    if local:  # add photo (in gallery mode) to the step html file and previous/next links
-                        step_file.write(f"<a href=\"#img{photo+1}\"><img class=\"thumb\" src=\"..\\{step_slug}_{step_id}\\photos\\{f}\"></a>\n")
-                        step_file.write(f"<div class=\"lightbox\" id=\"img{photo+1}\">\n")
-                        if photo > 0:
-                            step_file.write(f"<a href=\"#img{photo}\" class=\"light-btn btn-prev\"><</a>\n")
-                        else:
-                            step_image = f"..\\{step_slug}_{step_id}\\photos\\{f}"
-                        step_file.write(f"<a href=\"#_\" class=\"btn-close\">X</a>\n<img src=\"..\\{step_slug}_{step_id}\\photos\\{f}\">\n")
-                        if photo+1 < photos_nbr:
-                            step_file.write(f"<a href=\"#img{photo+2}\" class=\"light-btn btn-next\">></a>\n</div>\n")
-                        elif videos_nbr > 0:
-                            step_file.write(f"<a href=\"#vid1\" class=\"light-btn btn-next\">></a>\n</div>\n")
-                        else:
-                            step_file.write(f"</div>\n")
-                    # generate resized image to limit size to be sent by email if necessary
-                    if (mail or interactive) and height > 800:
-                        ratio = height / width
-                        new_height = 800
-                        new_width = int(new_height / ratio)
-                        resized_img = image.resize((new_width, new_height), Image.LANCZOS)
-                        tmp_img_path = os.path.join(extract_dir, 'tmp.jpg')
-                        resized_img.save(tmp_img_path)
-                        new_size = Path(tmp_img_path).stat().st_size
-                        new_total_size = new_total_size + new_size
-                        if verbose:
-                            text += f" compressible to {round(new_size/1024/102.4)/10}Mb"
-                        cfile = Path(tmp_img_path)
+    <h1>Polarsteps trips</h1>
+    <p id=intro>$count trips</p>
+$trips</body>
+""",
+    'trip': """<h2><a href="$link">$name</a> <small>$start-$end</small></h2>
+<p>$summary, $steps steps, $photos photo(s), $videos video(s)</p>
+""",
+    'trip_error': """<h2>$dir</h2><p>! $error</p>
+"""}.items()}
+
+
+# Function to generate map using tile name in parameter (allowed tiles by staticmaps listed below)
+if gen_map:
+    def tile(style=staticmaps.tile_provider_OSM):
+        map = staticmaps.Context()
+        map.set_tile_provider(style)
+        # staticmaps.tile_provider_OSM,
+        # staticmaps.tile_provider_ArcGISWorldImagery,
+        # staticmaps.tile_provider_CartoNoLabels,
+        # staticmaps.tile_provider_CartoDarkNoLabels,
+        # staticmaps.tile_provider_None,
+        # not working#staticmaps.tile_provider_StamenTerrain,
+        # not working#staticmaps.tile_provider_StamenToner,
+        # not working#staticmaps.tile_provider_StamenTonerLite,
+        return map
+
+    # Class getting map tiles from an offline directory ({zoom}/{x}/{y}.png files), or from the cache directory where downloaded tiles
+    # are kept (written at once, to be shared safely by several processes)
+    class MapTileDownloader(staticmaps.TileDownloader):
+        def __init__(self, offline_dir=""):
+            super().__init__()
+            self.offline_dir = offline_dir
+
+        def get(self, provider, cache_dir, zoom, x, y):
+            if self.offline_dir:
+                file_name = os.path.join(self.offline_dir, str(zoom), str(x), f"{y}.png")
+                return Path(file_name).read_bytes() if os.path.isfile(file_name) else None
+            file_name = self.cache_file_name(provider, cache_dir, zoom, x, y)
+            if os.path.isfile(file_name):
+                return Path(file_name).read_bytes()
+            data = super().get(provider, None, zoom, x, y)
+            if data is not None:
+                Path(os.path.dirname(file_name)).mkdir(parents=True, exist_ok=True)
+                tmp_name = f"{file_name}.{os.getpid()}.tmp"
+                Path(tmp_name).write_bytes(data)
+                os.replace(tmp_name, file_name)
+            return data
+
+
+# Function to render a static map in a PNG file (run in worker processes), with red markers, and red lines with white dots at their locations
+# (map_tiles gives an offline tiles directory, or "none" to render the map without background)
+def render_map(path, style, width, height, markers=(), lines=(), zoom=None, tiles_cache="", map_tiles=""):
+    start = time.perf_counter()
+    map = tile(staticmaps.tile_provider_None if map_tiles == "none" else staticmaps.default_tile_providers[style])
+    map.set_tile_downloader(MapTileDownloader("" if map_tiles == "none" else map_tiles))
+    map.set_cache_dir(tiles_cache)
+    if zoom is not None:
+        map.set_zoom(zoom)
+    for line in lines:
+        latlngs = [staticmaps.create_latlng(lat, lon) for lat, lon in line]
+        map.add_object(staticmaps.Line(latlngs, color=staticmaps.RED, width=3))
+        for latlng in latlngs:
+            map.add_object(staticmaps.Marker(latlng, color=staticmaps.WHITE, size=3))
+    for lat, lon in markers:
+        map.add_object(staticmaps.Marker(staticmaps.create_latlng(lat, lon), color=staticmaps.RED, size=12))
+    tmp_path = f"{path}.tmp.png"
+    if cairo is not None:
+        map.render_cairo(width, height).write_to_png(tmp_path)
+    else:
+        map.render_pillow(width, height).save(tmp_path)
+    os.replace(tmp_path, path)
+    return time.perf_counter() - start
+
+
+# Function to ask interactively for email parameters not set in the script
+def ask_mail_params():
+    # get global parameters
+    global dest_email
+    global orig_email
+    global mail_serv
+    global mail_port
+    # ask for undefined parameters
+    if dest_email == "":
+        dest_email = input("--> Input destination address where emails should be sent (i.e. myblog.mywp.com): ")
+    if orig_email == "":
+        orig_email = input("--> Input email address you want to appear in sent emails (i.e. myaddress.myisp.com): ")
+    if mail_serv == "":
+        mail_serv = input("--> Input email server that should be used to send emails (i.e. smtp.myisp.com): ")
+    if mail_port == "":
+        mail_port = input("--> Input email server port that should be used to send emails (i.e. 465 or 587 or 25): ")
+
+
+# Class keeping one authenticated SMTP session open for all emails of a run
+# (reconnects when the server drops the session and paces sends to respect mail_rate)
+class MailSender:
+    def __init__(self, server, port, rate=0):
+        self.server = server
+        self.port = int(port)
+        self.rate = rate  # maximum number of emails per minute (0 for no limit)
+        self.session = None
+        self.sent_times = collections.deque()  # time of emails sent during the last minute
+        self.sent = 0
+        self.connections = 0
+        self.ask_login = True  # login and password are only asked by the main thread
+
+    # open the session: SSL for port 465, otherwise plain connection upgraded with STARTTLS when offered
+    def connect(self):
+        global mail_login
+        global mail_passwd
+        if self.port == 465:
+            # for gmail ensure that you use an App password and not your regular password
+            session = smtplib.SMTP_SSL(self.server, self.port)
+        else:
+            session = smtplib.SMTP(self.server, self.port)
+        session.ehlo()
+        if self.port != 465 and session.has_extn('starttls'):
+            session.starttls()
+            session.ehlo()
+        if session.has_extn('auth'):  # local test servers usually do not ask for authentication
+            if (mail_login == "" or mail_passwd == "") and not self.ask_login:
+                raise smtplib.SMTPException("email login and password not set")
+            if mail_login == "":
+                mail_login = input("--> Input email login that should be used to send emails (i.e. myname@myisp.com): ")
+            if mail_passwd == "":
+                mail_passwd = input("-->Input email password that should be used to send emails: ")
+            session.login(mail_login, mail_passwd)
+        self.session = session
+        self.connections += 1
+
+    # wait if needed so that no more than 'rate' emails are sent in any 60 seconds window
+    def wait_rate(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        while self.sent_times and now - self.sent_times[0] >= 60:
+            self.sent_times.popleft()
+        if len(self.sent_times) >= self.rate:
+            delay = 60 - (now - self.sent_times[0])
+            print(f"Waiting {round(delay)}s to respect the limit of {self.rate} emails per minute...")
+            time.sleep(delay)
+            self.sent_times.popleft()
+
+    # send the email file in parameter through the DATA command, line by line so that only a chunk of the email is in memory
+    # (same as smtplib sendmail, which needs the whole email)
+    def send_file(self, path, from_addr, to_addrs):
+        session = self.session
+        code, resp = session.mail(from_addr)
+        if code != 250:
+            session.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        refused = {}
+        for to_addr in to_addrs:
+            code, resp = session.rcpt(to_addr)
+            if code not in (250, 251):
+                refused[to_addr] = (code, resp)
+        if len(refused) == len(to_addrs):
+            session.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, resp = session.docmd("data")
+        if code != 354:
+            session.rset()
+            raise smtplib.SMTPDataError(code, resp)
+        with open(path, 'rb') as f_in:
+            lines = []
+            for line in f_in:
+                line = line.rstrip(b"\r\n")
+                lines.append(b"." + line if line.startswith(b".") else line)  # dot stuffing
+                if len(lines) >= 1000:
+                    session.send(b"\r\n".join(lines) + b"\r\n")
+                    lines = []
+            session.send(b"\r\n".join(lines + [b"."]) + b"\r\n")
+        code, resp = session.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+
+    # send the email file in parameter (with its headers already read), reconnecting once if the session was dropped by the server
+    def send(self, path, msg):
+        to_addrs = [to_addr for name, to_addr in getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []))]
+        self.wait_rate()
+        for attempt in range(2):
+            try:
+                if self.session is None:
+                    self.connect()
+                with timed("smtp"):
+                    self.send_file(path, msg['From'], to_addrs)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self.session = None
+                if attempt > 0:
+                    raise smtplib.SMTPServerDisconnected(f"Connection to {self.server} lost ({e})")
+        self.sent_times.append(time.monotonic())
+        self.sent += 1
+        add_count("emails sent")
+
+    # close the session if still open
+    def close(self):
+        if self.session is not None:
+            try:
+                self.session.quit()
+            except (smtplib.SMTPException, ConnectionError):
+                pass
+            self.session = None
+
+
+# Function to set sender and recipient of the email message in parameter (asking email parameters when not defined)
+def address(msg):
+    ask_mail_params()
+    if msg['From'] is None:
+        msg['From'] = orig_email
+    if msg['To'] is None:
+        msg['To'] = ', '.join([dest_email])
+    return msg
+
+
+# Function to write the email message in parameter to the file in parameter, followed by the attachments in parameter given as
+# (filename, content type, data or path, size), files being read and encoded by chunks so that they are never whole in memory
+def write_message(path, msg, attachments=()):
+    if attachments:
+        msg.make_mixed()  # text of the email becomes its first part, attachments are written after it
+    head = msg.as_bytes()
+    if attachments:
+        boundary = msg.get_boundary().encode("ascii")
+        head = head[:head.rindex(b"--" + boundary + b"--")]
+    with open(path + ".tmp", 'wb') as f_out:
+        f_out.write(head)
+        for filename, ctype, source, size in attachments:
+            part = EmailMessage()
+            part['Content-Type'] = ctype
+            part['Content-Transfer-Encoding'] = "base64"
+            part.add_header('Content-Disposition', 'attachment', filename=filename)
+            part['MIME-Version'] = "1.0"
+            f_out.write(b"--" + boundary + b"\n" + part.as_bytes())
+            if isinstance(source, bytes):
+                f_out.write(base64.encodebytes(source))
+            else:
+                with storage(source).open(source) as f_in:
+                    for chunk in iter(lambda: f_in.read(57 * 1024), b""):  # 57 bytes give a line of 76 base64 characters
+                        f_out.write(base64.encodebytes(chunk))
+                        add_count("bytes read", len(chunk))
+            f_out.write(b"\n")
+        if attachments:
+            f_out.write(b"--" + boundary + b"--\n")
+    os.replace(path + ".tmp", path)
+
+
+# Function to return the headers of the email file in parameter, without reading its content
+def read_headers(path):
+    lines = []
+    with open(path, 'rb') as f_in:
+        for line in f_in:
+            if line in (b"\n", b"\r\n"):
+                break
+            lines.append(line)
+    return BytesParser(policy=policy.default).parsebytes(b"".join(lines), headersonly=True)
+
+
+# Function to send the email file in parameter (through the session shared by the whole run), trying again with an increasing
+# delay when the server fails temporarily, returns True if the email was sent
+def email(path, retries=0):
+    # get global parameters
+    global mail_sender
+    msg = read_headers(path)
+    if mail_sender is None:
+        mail_sender = MailSender(mail_serv, mail_port, mail_rate)
+    for attempt in range(retries + 1):
+        try:
+            mail_sender.send(path, msg)
+            print(f"Email {msg['Subject']} sent to {dest_email}.\n")
+            return True
+        except (smtplib.SMTPException, OSError) as e:
+            # refused addresses and 5xx errors (authentication, message refused...) would fail again
+            permanent = isinstance(e, smtplib.SMTPRecipientsRefused) or (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500)
+            if permanent or attempt == retries:
+                print(e)
+                return False
+            delay = 5 * 2 ** attempt
+            print(f"! Email {msg['Subject']} not sent ({e}), new attempt in {delay}s.")
+            time.sleep(delay)
+
+
+# Class sending emails in a background thread while next steps are prepared, through an outbox directory (Extracts/outbox):
+# all emails of a step are written to the outbox before being queued and removed once sent, so that emails not sent
+# (because of a failure or a crash) are sent again by the next run ; steps are marked as emailed in the manifest once all their emails were sent
+class MailQueue:
+    def __init__(self, directory, manifest, depth=2, retries=3):
+        global mail_sender
+        self.directory = directory
+        self.manifest = manifest
+        self.retries = retries
+        self.queue = queue.Queue(maxsize=depth)  # emails waiting to be sent, building next steps waits when it is full
+        self.lock = threading.Lock()
+        self.remaining = {}  # number of emails not sent yet for each step id (or "trip")
+        self.failed = set()  # steps with an email which could not be sent
+        self.sent = 0
+        self.not_sent = 0
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        # parameters, login and password are asked in the main thread (by opening the session), before emails are sent in background
+        ask_mail_params()
+        if mail_sender is None:
+            mail_sender = MailSender(mail_serv, mail_port, mail_rate)
+        if mail_sender.session is None:
+            try:
+                mail_sender.connect()
+            except (smtplib.SMTPException, OSError) as e:  # emails are kept in the outbox if the server is still not available
+                print(f"! Could not connect to email server ({e}).")
+        mail_sender.ask_login = False
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    # return the emails left in the outbox by previous runs, as {step id or "trip": [paths]}
+    def pending(self):
+        outbox = collections.defaultdict(list)
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".eml"):
+                outbox[name.split("_")[0]].append(os.path.join(self.directory, name))
+        return outbox
+
+    # write the emails in parameter (all emails of a step, as (message, attachments) tuples) to the outbox, replacing emails
+    # of the step left by previous runs, then queue them
+    def submit(self, key, messages):
+        for path in self.pending().get(key, []):
+            os.remove(path)
+        paths = []
+        for part, (msg, attachments) in enumerate(messages):
+            paths.append(os.path.join(self.directory, f"{key}_{part+1}.eml"))
+            write_message(paths[-1], address(msg), attachments)
+        self.resume(key, paths)
+
+    # raise an error if the background thread stopped, instead of waiting for it forever
+    def check(self):
+        if not self.thread.is_alive():
+            raise RuntimeError("email sending thread stopped")
+
+    # queue the emails of the outbox in parameter (waiting when too many emails are already queued)
+    def resume(self, key, paths):
+        with self.lock:
+            self.remaining[key] = len(paths)
+            self.failed.discard(key)
+        for path in paths:
+            while True:
+                self.check()
+                try:
+                    self.queue.put((key, path), timeout=1)
+                    break
+                except queue.Full:
+                    pass
+
+    # send queued emails until the queue is closed (an error on an email counts it as not sent, next emails are still sent)
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            key, path = item
+            counted = False
+            try:
+                with timed("email sending (background)"):
+                    sent = email(path, self.retries)
+                with self.lock:
+                    if sent:
+                        self.sent += 1
+                        self.remaining[key] -= 1
+                    else:
+                        self.not_sent += 1
+                        self.failed.add(key)
+                    counted = True
+                    done = self.remaining[key] == 0 and key not in self.failed
+                if sent:
+                    os.remove(path)
+                if done:
+                    self.manifest.set(('trip_emailed',) if key == "trip" else ('steps', key, 'emailed'), True)
+                    self.manifest.save()
+            except Exception as e:  # outbox file removed or not readable, invalid email, manifest not writable...
+                print(f"! Email {path} failed ({type(e).__name__}: {e}).")
+                if not counted:
+                    with self.lock:
+                        self.not_sent += 1
+                        self.failed.add(key)
+            finally:
+                self.queue.task_done()
+
+    # wait until all queued emails were sent (or failed)
+    def flush(self):
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                self.check()
+                self.queue.all_tasks_done.wait(1)
+
+    # wait for queued emails, stop the background thread and print the delivery summary
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        text = f"Delivery: {self.sent} email(s) sent"
+        if self.not_sent > 0:
+            text += f", {self.not_sent} not sent (kept in {self.directory} to be sent by next run)"
+        print(text + ".")
+
+
+# Function to add the duration in parameter to the time spent in the stage in parameter
+def add_time(stage, duration):
+    with stage_lock:
+        stage_times[stage] += duration
+
+
+# Function to add the number in parameter to the counter in parameter
+def add_count(counter, number=1):
+    with stage_lock:
+        stage_counts[counter] += number
+
+
+# Function to measure time spent in the stage in parameter (to be used in a 'with' statement)
+@contextlib.contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(stage, time.perf_counter() - start)
+
+
+# Class displaying with the profile option a live progress line of the outputs (each output counts once every step it generated),
+# with throughput and estimated remaining time
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.size = 0  # size of photos and videos of steps done
+        self.start = time.perf_counter()
+        self.shown = 0
+        self.lock = threading.Lock()
+        self.enabled = profile and not interactive and sys.stderr.isatty()  # not mixed with questions or redirected output
+
+    # count one more step generated by an output, with the size of its photos and videos
+    def advance(self, size=0):
+        with self.lock:
+            self.done += 1
+            self.size += size
+            now = time.perf_counter()
+            if not self.enabled or (now - self.shown < 0.2 and self.done < self.total):
+                return
+            self.shown = now
+            elapsed = now - self.start
+            eta = elapsed * (self.total - self.done) / self.done
+            sys.stderr.write(f"\rProgress: {self.done}/{self.total} ({round(100 * self.done / self.total)}%), {round(self.done / elapsed, 1)} steps/s, "
+                             f"{round(self.size / 1024 / 1024 / elapsed, 1)}Mb/s, remaining {round(eta)}s   ")
+            if self.done == self.total:
+                sys.stderr.write("\n")
+            sys.stderr.flush()
+
+
+# Class reading files of an unzipped Polarsteps export (files are given by their path)
+class DirStorage:
+    def open(self, path):
+        return open(path, 'rb')
+
+    def exists(self, path):
+        return os.path.isfile(path)
+
+    # return size and modification time (in ns) of the file in parameter
+    def stat(self, path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    # return the content of the directory in parameter as (name, is directory, size, modification time in ns) tuples
+    def listdir(self, path):
+        with os.scandir(path) as entries:
+            return [(entry.name, entry.is_dir(), 0, 0) if entry.is_dir() else (entry.name, False, entry.stat().st_size, entry.stat().st_mtime_ns)
+                    for entry in entries]
+
+    # return the path of the file in parameter on disk (to be used by external programs like ffmpeg)
+    @contextlib.contextmanager
+    def local_file(self, path):
+        yield path
+
+
+# Class reading files of a Polarsteps export directly from its zip file, without unzipping it: files are given by their path
+# through the zip file (export.zip/trip_123/trip.json), found in its central directory and decompressed only when read
+class ZipStorage:
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.pid = os.getpid()  # zip file is opened again by worker processes, to read it in parallel
+        self.archive = zipfile.ZipFile(zip_path)
+        self.members = {}  # files and directories of each directory of the zip file, by name
+        for info in self.archive.infolist():
+            parts = info.filename.rstrip("/").split("/")
+            for level in range(len(parts)):
+                children = self.members.setdefault("/".join(parts[:level]), {})
+                if level == len(parts) - 1 and not info.is_dir():
+                    children[parts[level]] = info
+                else:
+                    children.setdefault(parts[level], None)
+
+    # return the name in the zip file of the path in parameter
+    def member(self, path):
+        name = os.path.relpath(path, self.zip_path).replace(os.sep, "/")
+        return "" if name == "." else name
+
+    def info(self, path):
+        name = self.member(path)
+        return self.members.get(os.path.dirname(name), {}).get(os.path.basename(name))
+
+    def open(self, path):
+        return self.archive.open(self.member(path))
+
+    def exists(self, path):
+        return self.info(path) is not None
+
+    def stat(self, path):
+        info = self.info(path)
+        return info.file_size, int(time.mktime(info.date_time + (0, 0, -1))) * 1000000000
+
+    def listdir(self, path):
+        if self.member(path) not in self.members:
+            raise FileNotFoundError(path)
+        return [(name, info is None, 0, 0) if info is None else (name, False, info.file_size, int(time.mktime(info.date_time + (0, 0, -1))) * 1000000000)
+                for name, info in self.members[self.member(path)].items()]
+
+    # extract the file in parameter to a temporary file, removed once used
+    @contextlib.contextmanager
+    def local_file(self, path):
+        with self.open(path) as f_in, tempfile.NamedTemporaryFile(suffix=os.path.splitext(path)[1], delete=False) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024*1024)
+        try:
+            yield f_out.name
+        finally:
+            os.remove(f_out.name)
+
+
+dir_storage = DirStorage()
+zip_storages = {}  # zip files opened by the process, by path
+zip_lock = threading.Lock()
+
+
+# Function to return the storage of the file or directory in parameter: a zip file when its path goes through a .zip file, a directory otherwise
+def storage(path):
+    head, sep, tail = path.partition(".zip" + os.sep)
+    zip_path = head + ".zip" if sep else path if path.endswith(".zip") else None
+    if zip_path is None or not os.path.isfile(zip_path):
+        return dir_storage
+    with zip_lock:
+        store = zip_storages.get(zip_path)
+        if store is None or store.pid != os.getpid():
+            store = zip_storages[zip_path] = ZipStorage(zip_path)
+        return store
+
+
+# Function to return the directory where outputs of the trip in parameter are written: the trip directory, or for a trip read
+# from a zip file, the same directory next to the zip file (outputs of export.zip/trip_123 are written in export/trip_123)
+def output_path(path):
+    store = storage(path)
+    return path if store is dir_storage else os.path.splitext(store.zip_path)[0] + path[len(store.zip_path):]
+
+
+# Function to scan once the trip directory in parameter, returning photos and videos (with size and modification time of each file,
+# to detect changes between runs) of all steps directories ({step_slug}_{step_id}) as {step_id: {"photos": [...], "videos": [...]}}
+def scan_media(original_path):
+    step_media = {}
+    store = storage(original_path)
+    for step_name, step_is_dir, step_size, step_mtime in store.listdir(original_path):
+        step_id = step_name.rsplit("_", 1)[-1]
+        if not step_id.isdigit() or not step_is_dir:
+            continue
+        media = step_media.setdefault(int(step_id), {"photos": [], "videos": []})
+        for kind, kind_is_dir, kind_size, kind_mtime in store.listdir(os.path.join(original_path, step_name)):
+            if kind in media and kind_is_dir:
+                media[kind] += [Media(kind, name, os.path.join(original_path, step_name, kind, name), size, mtime_ns)
+                                for name, is_dir, size, mtime_ns in store.listdir(os.path.join(original_path, step_name, kind))
+                                if name != "Thumbs.db" and not is_dir]
+    return step_media
+
+
+# Function to return the time the media in parameter was taken, to sort photos and videos of a step: EXIF date of photos
+# (local time, with its EXIF offset from UTC or in the timezone in parameter) or creation time of videos (UTC),
+# or modification time of the file when unknown
+def capture_time(media, zone):
+    if media.date:
+        try:
+            if media.offset:
+                return datetime.datetime.strptime(media.date + media.offset, "%Y:%m:%d %H:%M:%S%z").timestamp()
+            date = datetime.datetime.strptime(media.date, "%Y:%m:%d %H:%M:%S")
+            return date.replace(tzinfo=tz.UTC if media.kind == "videos" else zone).timestamp()
+        except ValueError:  # invalid or incomplete EXIF date
+            pass
+    return media.mtime_ns / 1e9
+
+
+# Function to load JSON file in parameter, returning default content if it does not exist or cannot be read
+def load_json(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f_in:
+                return json.load(f_in)
+        except (OSError, ValueError):
+            print(f"! File {path} could not be read, ignored.")
+    return default
+
+
+# Function to write text (or bytes) file in parameter, replaced at once to never leave a partially written file
+def write_file(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') if isinstance(text, bytes) else open(tmp_path, 'w', encoding="utf-8") as f_out:
+        f_out.write(text)
+    os.replace(tmp_path, path)
+
+
+# Function to save content in parameter as JSON file, replaced at once to never leave a partially written file
+def save_json(path, content):
+    write_file(path, json.dumps(content))
+
+
+# Function to render html content in parameter from its template
+# (lists of values, like photos of a step page or steps of index.htm, are rendered item by item with the template named in each item)
+def render_page(template, page):
+    values = {key: "".join(render_page(item['template'], item) for item in value) if isinstance(value, list) else value
+              for key, value in page.items()}
+    return html_templates[template].substitute(values)
+
+
+# Function to render html page in parameter and write it at once (run in a thread pool, off the steps loop)
+def write_page(path, template, page):
+    write_file(path, render_page(template, page))
+
+
+# Function to return the name of the page of index.htm listing the step number in parameter (index.htm, index_2.htm...)
+def index_page_name(number):
+    page = number // index_page_size if index_page_size > 0 else 0
+    return "index.htm" if page == 0 else f"index_{page+1}.htm"
+
+
+# Function to compute fingerprint of a step page from everything used to generate it
+# (step information, photos and videos, names of previous and next steps linked in footer, trip name and this script)
+def step_fingerprint(step, prev_step, next_step, trip_name, script_hash, derivatives=None, index_link="index.htm"):
+    neighbours = [[s.id, s.name] if s is not None else None for s in (prev_step, next_step)]
+    content = json.dumps([step.state(), neighbours, trip_name, script_hash, derivatives, index_link], sort_keys=True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+# Function to get size of the photo in parameter and resize it in memory (as JPEG) if taller than max_height (run in worker processes)
+def process_photo(cfile, resize, max_height=800, quality=75):
+    start = time.perf_counter()
+    initial_size = storage(cfile).stat(cfile)[0]
+    resized_data = None
+    new_size = initial_size
+    if not resize:  # photo is not decoded when it does not need to be resized
+        return initial_size, resized_data, new_size, time.perf_counter() - start
+    with storage(cfile).open(cfile) as f_in, Image.open(f_in) as image:
+        width, height = image.size
+        if height > max_height:
+            ratio = height / width
+            new_height = max_height
+            new_width = int(new_height / ratio)
+            resized_img = image.resize((new_width, new_height), Image.LANCZOS)
+            if resized_img.mode not in ("RGB", "L"):  # JPEG does not support transparency or palettes
+                resized_img = resized_img.convert("RGB")
+            buffer = io.BytesIO()
+            resized_img.save(buffer, format="JPEG", quality=quality)
+            resized_data = buffer.getvalue()
+            new_size = len(resized_data)
+    return initial_size, resized_data, new_size, time.perf_counter() - start
+
+
+# Function to compress a photo (run in worker threads) to at most max_size bytes, searching the best JPEG quality from the given one
+# down to 20 and then reducing its height when needed ; the photo is decoded once, returns the JPEG data (the smallest one found
+# if none fits) and the time spent
+def fit_photo(cfile, max_size, max_height=800, quality=75):
+    start = time.perf_counter()
+    with storage(cfile).open(cfile) as f_in, Image.open(f_in) as image:
+        width, height = image.size
+        new_height = min(height, max_height)
+        while True:
+            resized_img = image.resize((max(1, int(new_height * width / height)), new_height), Image.LANCZOS) if new_height < height else image
+            if resized_img.mode not in ("RGB", "L"):  # JPEG does not support transparency or palettes
+                resized_img = resized_img.convert("RGB")
+            # binary search of the highest quality giving a small enough photo
+            low, high = 20, max(20, quality)
+            best = None
+            while low <= high:
+                buffer = io.BytesIO()
+                resized_img.save(buffer, format="JPEG", quality=(low + high) // 2)
+                data = buffer.getvalue()
+                if len(data) <= max_size:
+                    best = data
+                    low = (low + high) // 2 + 1
+                else:
+                    smallest = data
+                    high = (low + high) // 2 - 1
+            if best is not None or new_height <= 240:
+                return best or smallest, time.perf_counter() - start
+            new_height = max(240, int(new_height * 0.75))
+
+
+# Function to return the size of data of the size in parameter once encoded in an email (base64 in lines of 76 characters)
+def encoded_size(size):
+    return (size + 2) // 3 * 4 * 78 // 76
+
+
+# Function to return the size in an email of the attachments in parameter, given as (filename, content type, data or path, size)
+def attachments_size(attachments):
+    return sum(encoded_size(size) + 1024 for filename, ctype, source, size in attachments)  # with MIME headers of each attachment
+
+
+# Function to write the thumbnail and the screen sized copy of a photo (run in worker processes), returns the time spent
+# (JPEG photos are decoded directly at a reduced scale, and files are written at once to never leave a partial image)
+def make_thumbnails(cfile, thumb_path, screen_path, thumb_height=360, screen_size=1600):
+    start = time.perf_counter()
+    with storage(cfile).open(cfile) as f_in, Image.open(f_in) as image:
+        ratio = min(1, screen_size / max(image.size))
+        image.draft("RGB", (int(image.size[0] * ratio), int(image.size[1] * ratio)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        for path, box in ((screen_path, (screen_size, screen_size)), (thumb_path, (4 * thumb_height, thumb_height))):
+            image.thumbnail(box, Image.LANCZOS)
+            Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+            image.save(f"{path}.tmp", format="JPEG", quality=80)
+            os.replace(f"{path}.tmp", path)
+    return time.perf_counter() - start
+
+
+# Function to extract with ffmpeg the poster frame of a video (run in worker processes), returns the time spent
+# (the frame is taken 1 second after the start of the video, or at its start for shorter videos)
+def make_poster(cfile, poster_path, thumb_height=360):
+    start = time.perf_counter()
+    Path(os.path.dirname(poster_path)).mkdir(parents=True, exist_ok=True)
+    with storage(cfile).local_file(cfile) as local_path:
+        for position in ("1", "0"):
+            subprocess.run([ffmpeg_path, "-v", "error", "-y", "-ss", position, "-i", local_path, "-frames:v", "1",
+                            "-vf", f"scale=-2:{thumb_height}", "-f", "mjpeg", f"{poster_path}.tmp"], check=True, stdin=subprocess.DEVNULL)
+            if os.path.exists(f"{poster_path}.tmp") and os.path.getsize(f"{poster_path}.tmp") > 0:
+                os.replace(f"{poster_path}.tmp", poster_path)
+                return time.perf_counter() - start
+    raise RuntimeError("no frame found")
+
+
+# Function to transcode with ffmpeg a video (run in worker processes) to H.264/AAC at most max_height pixels high, returns the time spent
+# (the file is written at once to never leave a partial video, and moov box is put first so that browsers can play it while loading)
+def transcode_video(cfile, video_path, max_height=720, quality=28):
+    start = time.perf_counter()
+    Path(os.path.dirname(video_path)).mkdir(parents=True, exist_ok=True)
+    with storage(cfile).local_file(cfile) as local_path:
+        subprocess.run([ffmpeg_path, "-v", "error", "-y", "-i", local_path, "-vf", f"scale=-2:'min({max_height},trunc(ih/2)*2)'",
+                        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(quality), "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "128k",
+                        "-movflags", "+faststart", "-f", "mp4", f"{video_path}.tmp"], check=True, stdin=subprocess.DEVNULL)
+    os.replace(f"{video_path}.tmp", video_path)
+    return time.perf_counter() - start
+
+
+# Function to tell if the file derived from a media file (thumbnail, poster...) is missing or older than the media file
+def outdated(source, derived):
+    try:
+        return os.stat(derived).st_mtime_ns < storage(source).stat(source)[1]
+    except FileNotFoundError:
+        return True
+
+
+# Class keeping resized photos in a directory between runs, to avoid decoding them again
+# (entries are identified by source path, size, modification time and resize parameters; least recently used ones are evicted above max_size)
+class MediaCache:
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size  # in bytes
+        self.index_path = os.path.join(directory, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0  # size of photos that did not need to be decoded
+        self.evicted = 0
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.entries = load_json(self.index_path, {})
+        self.size = sum(entry['size'] for entry in self.entries.values() if entry['resized'])  # updated when saved
+
+    # return the key identifying the resized version of the photo in parameter
+    def key(self, cfile, max_height, quality):
+        size, mtime_ns = storage(cfile).stat(cfile)
+        ident = f"{os.path.abspath(cfile)}|{size}|{mtime_ns}|{max_height}|{quality}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+    # return the result stored for the key in parameter (same as process_photo) or None if not in cache
+    def get(self, key):
+        entry = self.entries.get(key)
+        resized_data = None
+        if entry is not None and entry['resized']:
+            try:
+                resized_data = Path(self.directory, f"{key}.jpg").read_bytes()
+            except OSError:
+                del self.entries[key]
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        entry['used'] = time.time()
+        self.hits += 1
+        self.saved += entry['initial']
+        return entry['initial'], resized_data, entry['size'], 0
+
+    # store the result of process_photo for the key in parameter
+    def put(self, key, result):
+        initial_size, resized_data, new_size, worker_time = result
+        if resized_data is not None:
+            Path(self.directory, f"{key}.jpg").write_bytes(resized_data)
+        self.entries[key] = {'initial': initial_size, 'size': new_size, 'resized': resized_data is not None, 'used': time.time()}
+
+    # evict least recently used photos above the maximum size, then save the index
+    def save(self):
+        resized = sorted((key for key in self.entries if self.entries[key]['resized']), key=lambda key: self.entries[key]['used'])
+        total = sum(self.entries[key]['size'] for key in resized)
+        for key in resized:
+            if total <= self.max_size:
+                break
+            total -= self.entries[key]['size']
+            del self.entries[key]
+            try:
+                os.remove(os.path.join(self.directory, f"{key}.jpg"))
+            except OSError:
+                pass
+            self.evicted += 1
+        save_json(self.index_path, self.entries)
+        self.size = total
+
+    # print cache statistics of the run
+    def print_stats(self):
+        print(f"Cache: {self.hits} hit(s), {self.misses} miss(es), {round(self.saved/1024/102.4)/10}Mb of photos not decoded again, "
+              f"{len(self.entries)} entries ({round(self.size/1024/102.4)/10}Mb), {self.evicted} evicted.")
+
+
+# Function to process photos given as (path, resize) tuples with several worker processes, yielding results in the same order
+# (resized photos are taken from the cache when given, and stored in it otherwise)
+def process_photos(jobs, workers=1, max_height=800, quality=75, cache=None):
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = collections.deque()  # (cache key if result should be stored, result or future) in photos order
+
+    def next_result():
+        key, result = pending.popleft()
+        if isinstance(result, concurrent.futures.Future):
+            result = result.result()
+        if key is not None:
+            cache.put(key, result)
+        return result
+
+    try:
+        for cfile, resize in jobs:
+            key = cache.key(cfile, max_height, quality) if cache is not None and resize else None
+            result = cache.get(key) if key is not None else None
+            if result is not None:
+                key = None
+            elif executor is None:
+                result = process_photo(cfile, resize, max_height, quality)
+            else:
+                result = executor.submit(process_photo, cfile, resize, max_height, quality)
+            pending.append((key, result))
+            while len(pending) > (4 * workers if executor is not None else 0):  # limit the number of results waiting in memory
+                yield next_result()
+        while pending:
+            yield next_result()
+    finally:  # cancel photos not processed yet when stopping before the end (interactive quit)
+        for key, result in pending:
+            if isinstance(result, concurrent.futures.Future):
+                result.cancel()
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.save()
+
+
+# define table to use special UTF-8 characters (emoticon) to weather conditions and countries
+weather_dict = {"rain": "\U0001F327", "clear-day": "\U0001F506", "partly-cloudy-day": "\U000026C5",
+                "snow": "\U000026C4", "cloudy": "\U00002601"}
+country_dict = { #these countries denominations have been tested as used by PS in 2024/07
+"Andorra":"\U0001F1E6\U0001F1E9","United Arab Emirates":"\U0001F1E6\U0001F1EA","Afghanistan":"\U0001F1E6\U0001F1EB","Antigua and Barbuda":"\U0001F1E6\U0001F1EC","Anguilla":"\U0001F1E6\U0001F1EE","Albania":"\U0001F1E6\U0001F1F1","Armenia":"\U0001F1E6\U0001F1F2","Angola":"\U0001F1E6\U0001F1F4","Antarctica":"\U0001F1E6\U0001F1F6","Argentina":"\U0001F1E6\U0001F1F7","Austria":"\U0001F1E6\U0001F1F9","Australia":"\U0001F1E6\U0001F1FA","Azerbaijan":"\U0001F1E6\U0001F1FF","Bosnia and Herzegovina":"\U0001F1E7\U0001F1E6","Barbados":"\U0001F1E7\U0001F1E7","Bangladesh":"\U0001F1E7\U0001F1E9","Belgium":"\U0001F1E7\U0001F1EA","Burkina Faso":"\U0001F1E7\U0001F1EB","Bulgaria":"\U0001F1E7\U0001F1EC","Bahrain":"\U0001F1E7\U0001F1ED","Burundi":"\U0001F1E7\U0001F1EE","Benin":"\U0001F1E7\U0001F1EF","Saint Barthelemy":"\U0001F1E7\U0001F1F1","Bermuda":"\U0001F1E7\U0001F1F2","Brunei":"\U0001F1E7\U0001F1F3","Bolivia":"\U0001F1E7\U0001F1F4","Brazil":"\U0001F1E7\U0001F1F7","Bahamas":"\U0001F1E7\U0001F1F8","Bhutan":"\U0001F1E7\U0001F1F9","Botswana":"\U0001F1E7\U0001F1FC","Belarus":"\U0001F1E7\U0001F1FE","Belize":"\U0001F1E7\U0001F1FF","Canada":"\U0001F1E8\U0001F1E6","Democratic Republic of the Congo":"\U0001F1E8\U0001F1E9","Central African Republic":"\U0001F1E8\U0001F1EB","Congo":"\U0001F1E8\U0001F1EC","Switzerland":"\U0001F1E8\U0001F1ED","Côte d'Ivoire":"\U0001F1E8\U0001F1EE","Cook Islands":"\U0001F1E8\U0001F1F0","Chile":"\U0001F1E8\U0001F1F1","Cameroon":"\U0001F1E8\U0001F1F2","China":"\U0001F1E8\U0001F1F3","Colombia":"\U0001F1E8\U0001F1F4","Costa Rica":"\U0001F1E8\U0001F1F7","Cuba":"\U0001F1E8\U0001F1FA","Cape Verde":"\U0001F1E8\U0001F1FB","Curacao":"\U0001F1E8\U0001F1FC","Cyprus":"\U0001F1E8\U0001F1FE","Czechia":"\U0001F1E8\U0001F1FF","Germany":"\U0001F1E9\U0001F1EA","Djibouti":"\U0001F1E9\U0001F1EF","Denmark":"\U0001F1E9\U0001F1F0","Dominica":"\U0001F1E9\U0001F1F2","Dominican Republic":"\U0001F1E9\U0001F1F4","Algeria":"\U0001F1E9\U0001F1FF","Ecuador":"\U0001F1EA\U0001F1E8","Estonia":"\U0001F1EA\U0001F1EA","Egypt":"\U0001F1EA\U0001F1EC","Sahrawi Arab Democratic Republic":"\U0001F1EA\U0001F1ED","Eritrea":"\U0001F1EA\U0001F1F7","Spain":"\U0001F1EA\U0001F1F8","Ethiopia":"\U0001F1EA\U0001F1F9","Finland":"\U0001F1EB\U0001F1EE","Fiji":"\U0001F1EB\U0001F1EF","Falkland Islands":"\U0001F1EB\U0001F1F0","Federated States of Micronesia":"\U0001F1EB\U0001F1F2","Faroe Islands":"\U0001F1EB\U0001F1F4","France":"\U0001F1EB\U0001F1F7","Gabon":"\U0001F1EC\U0001F1E6","United Kingdom":"\U0001F1EC\U0001F1E7","Grenada":"\U0001F1EC\U0001F1E9","Georgia":"\U0001F1EC\U0001F1EA","Guernsey":"\U0001F1EC\U0001F1EC","Ghana":"\U0001F1EC\U0001F1ED","Gibraltar":"\U0001F1EC\U0001F1EE","Greenland":"\U0001F1EC\U0001F1F1","The Gambia":"\U0001F1EC\U0001F1F2","Guinea":"\U0001F1EC\U0001F1F3","Equatorial Guinea":"\U0001F1EC\U0001F1F6","Greece":"\U0001F1EC\U0001F1F7","South Georgia and the South Sandwich Islands":"\U0001F1EC\U0001F1F8","Guatemala":"\U0001F1EC\U0001F1F9","Guinea-Bissau":"\U0001F1EC\U0001F1FC","Guyana":"\U0001F1EC\U0001F1FE","Hong Kong":"\U0001F1ED\U0001F1F0","Honduras":"\U0001F1ED\U0001F1F3","Croatia":"\U0001F1ED\U0001F1F7","Haiti":"\U0001F1ED\U0001F1F9","Hungary":"\U0001F1ED\U0001F1FA","Indonesia":"\U0001F1EE\U0001F1E9","Ireland":"\U0001F1EE\U0001F1EA","Israel":"\U0001F1EE\U0001F1F1","Isle of Man":"\U0001F1EE\U0001F1F2","India":"\U0001F1EE\U0001F1F3","British Indian Ocean Territory":"\U0001F1EE\U0001F1F4","Iraq":"\U0001F1EE\U0001F1F6","Iran":"\U0001F1EE\U0001F1F7","Iceland":"\U0001F1EE\U0001F1F8","Italy":"\U0001F1EE\U0001F1F9","Jersey":"\U0001F1EF\U0001F1EA","Jamaica":"\U0001F1EF\U0001F1F2","Jordan":"\U0001F1EF\U0001F1F4","Japan":"\U0001F1EF\U0001F1F5","Kenya":"\U0001F1F0\U0001F1EA","Kyrgyzstan":"\U0001F1F0\U0001F1EC","Cambodia":"\U0001F1F0\U0001F1ED","Kiribati":"\U0001F1F0\U0001F1EE","Comoros":"\U0001F1F0\U0001F1F2","Saint Kitts and Nevis":"\U0001F1F0\U0001F1F3","North Korea":"\U0001F1F0\U0001F1F5","South Korea":"\U0001F1F0\U0001F1F7","Kuwait":"\U0001F1F0\U0001F1FC","Cayman Islands":"\U0001F1F0\U0001F1FE","Kazakhstan":"\U0001F1F0\U0001F1FF","Laos":"\U0001F1F1\U0001F1E6","Lebanon":"\U0001F1F1\U0001F1E7","Saint Lucia":"\U0001F1F1\U0001F1E8","Liechtenstein":"\U0001F1F1\U0001F1EE","Sri Lanka":"\U0001F1F1\U0001F1F0","Liberia":"\U0001F1F1\U0001F1F7","Lesotho":"\U0001F1F1\U0001F1F8","Lithuania":"\U0001F1F1\U0001F1F9","Luxembourg":"\U0001F1F1\U0001F1FA","Latvia":"\U0001F1F1\U0001F1FB","Libya":"\U0001F1F1\U0001F1FE","Morocco":"\U0001F1F2\U0001F1E6","Monaco":"\U0001F1F2\U0001F1E8","Moldova":"\U0001F1F2\U0001F1E9","Montenegro":"\U0001F1F2\U0001F1EA","Saint Martin":"\U0001F1F2\U0001F1EB","Madagascar":"\U0001F1F2\U0001F1EC","Marshall Islands":"\U0001F1F2\U0001F1ED","North Macedonia":"\U0001F1F2\U0001F1F0","Mali":"\U0001F1F2\U0001F1F1","Myanmar":"\U0001F1F2\U0001F1F2","Mongolia":"\U0001F1F2\U0001F1F3","Mauritania":"\U0001F1F2\U0001F1F7","Montserrat":"\U0001F1F2\U0001F1F8","Malta":"\U0001F1F2\U0001F1F9","Mauritius":"\U0001F1F2\U0001F1FA","Maldives":"\U0001F1F2\U0001F1FB","Malawi":"\U0001F1F2\U0001F1FC","Mexico":"\U0001F1F2\U0001F1FD","Malaysia":"\U0001F1F2\U0001F1FE","Mozambique":"\U0001F1F2\U0001F1FF","Namibia":"\U0001F1F3\U0001F1E6","New Caledonia":"\U0001F1F3\U0001F1E8","Niger":"\U0001F1F3\U0001F1EA","Norfolk Island":"\U0001F1F3\U0001F1EB","Nigeria":"\U0001F1F3\U0001F1EC","Nicaragua":"\U0001F1F3\U0001F1EE","Netherlands":"\U0001F1F3\U0001F1F1","Norway":"\U0001F1F3\U0001F1F4","Nepal":"\U0001F1F3\U0001F1F5","Nauru":"\U0001F1F3\U0001F1F7","Niue":"\U0001F1F3\U0001F1FA","New Zealand":"\U0001F1F3\U0001F1FF","Oman":"\U0001F1F4\U0001F1F2","Panama":"\U0001F1F5\U0001F1E6","Peru":"\U0001F1F5\U0001F1EA","Papua New Guinea":"\U0001F1F5\U0001F1EC","Philippines":"\U0001F1F5\U0001F1ED","Pakistan":"\U0001F1F5\U0001F1F0","Poland":"\U0001F1F5\U0001F1F1","Pitcairn Islands":"\U0001F1F5\U0001F1F3","Puerto Rico":"\U0001F1F5\U0001F1F7","Palestinian Territory":"\U0001F1F5\U0001F1F8","Portugal":"\U0001F1F5\U0001F1F9","Palau":"\U0001F1F5\U0001F1FC","Paraguay":"\U0001F1F5\U0001F1FE","Qatar":"\U0001F1F6\U0001F1E6","Romania":"\U0001F1F7\U0001F1F4","Serbia":"\U0001F1F7\U0001F1F8","Russia":"\U0001F1F7\U0001F1FA","Rwanda":"\U0001F1F7\U0001F1FC","Saudi Arabia":"\U0001F1F8\U0001F1E6","Solomon Islands":"\U0001F1F8\U0001F1E7","Seychelles":"\U0001F1F8\U0001F1E8","Sudan":"\U0001F1F8\U0001F1E9","Sweden":"\U0001F1F8\U0001F1EA","Singapore":"\U0001F1F8\U0001F1EC","Saint Helena, Ascension and Tristan da Cunha":"\U0001F1F8\U0001F1ED","Slovenia":"\U0001F1F8\U0001F1EE","Slovakia":"\U0001F1F8\U0001F1F0","Sierra Leone":"\U0001F1F8\U0001F1F1","San Marino":"\U0001F1F8\U0001F1F2","Senegal":"\U0001F1F8\U0001F1F3","Somalia":"\U0001F1F8\U0001F1F4","Suriname":"\U0001F1F8\U0001F1F7","South Sudan":"\U0001F1F8\U0001F1F8","São Tomé and Príncipe":"\U0001F1F8\U0001F1F9","El Salvador":"\U0001F1F8\U0001F1FB","Sint Maarten":"\U0001F1F8\U0001F1FD","Syria":"\U0001F1F8\U0001F1FE","eSwatini":"\U0001F1F8\U0001F1FF","Turks and Caicos Islands":"\U0001F1F9\U0001F1E8","Chad":"\U0001F1F9\U0001F1E9","French Southern and Antarctic Lands":"\U0001F1F9\U0001F1EB","Togo":"\U0001F1F9\U0001F1EC","Thailand":"\U0001F1F9\U0001F1ED","Tajikistan":"\U0001F1F9\U0001F1EF","Tokelau":"\U0001F1F9\U0001F1F0","East Timor":"\U0001F1F9\U0001F1F1","Turkmenistan":"\U0001F1F9\U0001F1F2","Tunisia":"\U0001F1F9\U0001F1F3","Tonga":"\U0001F1F9\U0001F1F4","Turkey":"\U0001F1F9\U0001F1F7","Trinidad and Tobago":"\U0001F1F9\U0001F1F9","Tuvalu":"\U0001F1F9\U0001F1FB","Taiwan":"\U0001F1F9\U0001F1FC","Tanzania":"\U0001F1F9\U0001F1FF","Ukraine":"\U0001F1FA\U0001F1E6","Uganda":"\U0001F1FA\U0001F1EC","USA":"\U0001F1FA\U0001F1F8","Uruguay":"\U0001F1FA\U0001F1FE","Uzbekistan":"\U0001F1FA\U0001F1FF","Vatican City":"\U0001F1FB\U0001F1E6","Saint Vincent and the Grenadines":"\U0001F1FB\U0001F1E8","Venezuela":"\U0001F1FB\U0001F1EA","British Virgin Islands":"\U0001F1FB\U0001F1EC","US Virgin Islands":"\U0001F1FB\U0001F1EE","Vietnam":"\U0001F1FB\U0001F1F3","Vanuatu":"\U0001F1FB\U0001F1FA","Samoa":"\U0001F1FC\U0001F1F8","Kosovo":"\U0001F1FD\U0001F1F0","Yemen":"\U0001F1FE\U0001F1EA","South Africa":"\U0001F1FF\U0001F1E6","Zambia":"\U0001F1FF\U0001F1F2","Zimbabwe":"\U0001F1FF\U0001F1FC",
+# additional denominations not identified as used by PS
+"American Samoa":"\U0001F1E6\U0001F1F8","Aruba":"\U0001F1E6\U0001F1FC","Åland Islands":"\U0001F1E6\U0001F1FD","Bonaire, Sint Eustatius and Saba":"\U0001F1E7\U0001F1F6","Bouvet Island":"\U0001F1E7\U0001F1FB","Cocos (Keeling) Islands":"\U0001F1E8\U0001F1E8","Christmas Island":"\U0001F1E8\U0001F1FD","French Guiana":"\U0001F1EC\U0001F1EB","Guadeloupe":"\U0001F1EC\U0001F1F5","Guam":"\U0001F1EC\U0001F1FA","Heard Island and Mcdonald Islands":"\U0001F1ED\U0001F1F2","Macao":"\U0001F1F2\U0001F1F4","Northern Mariana Islands":"\U0001F1F2\U0001F1F5","Martinique":"\U0001F1F2\U0001F1F6","French Polynesia":"\U0001F1F5\U0001F1EB","Saint Pierre and Miquelon":"\U0001F1F5\U0001F1F2","Réunion":"\U0001F1F7\U0001F1EA","Svalbard and Jan Mayen":"\U0001F1F8\U0001F1EF","United States Minor Outlying Islands":"\U0001F1FA\U0001F1F2","Wallis and Futuna":"\U0001F1FC\U0001F1EB","Mayotte":"\U0001F1FE\U0001F1F9"}
+
+
+# Class describing a photo or a video of a step ('photos' or 'videos' kind, like the directory storing it)
+class Media:
+    __slots__ = ('kind', 'name', 'path', 'size', 'mtime_ns', 'resized_size', 'width', 'height', 'date', 'orientation', 'offset')
+
+    def __init__(self, kind, name, path, size, mtime_ns):
+        self.kind = kind
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.resized_size = None  # size of the photo resized for emails, when it was resized
+        # dimensions, EXIF date ('YYYY:MM:DD HH:MM:SS'), orientation and offset of the date from UTC ('+HH:MM', when the camera
+        # recorded it), only known once probed by the media index
+        self.width = None
+        self.height = None
+        self.date = None
+        self.orientation = None
+        self.offset = None
+
+    # return name, size and modification time of the file, to detect changes between runs
+    def state(self):
+        return [self.kind, self.name, self.size, self.mtime_ns]
+
+
+# Class describing a step of the trip, built once from its trip.json entry and used by all outputs
+class Step:
+    __slots__ = ('id', 'slug', 'name', 'number', 'start_time', 'time', 'date', 'location_name', 'lat', 'lon', 'location_country',
+                 'location_detail', 'country', 'weather_condition', 'weather', 'temperature', 'journal', 'route', 'zone', 'photos', 'videos',
+                 'email_size')
+
+    def __init__(self, entry, number, to_zone, media):
+        self.id = entry['id']
+        self.slug = entry['slug']
+        self.name = entry['display_name']
+        self.number = number
+        # prefer start time of the step than the creation time in PS as the time of the step to be displayed
+        self.start_time = entry['start_time']
+        creation_time = datetime.datetime.fromtimestamp(entry['start_time'])
+        creation_time = creation_time.replace(tzinfo=tz.gettz('UTC'))
+        self.time = creation_time.astimezone(to_zone)
+        self.date = self.time.strftime('%Y-%m-%d')
+        # get location information
+        self.location_name = entry['location']['name']
+        self.lat = entry['location']['lat']
+        self.lon = entry['location']['lon']
+        self.location_country = entry['location']['detail']
+        self.location_detail = entry['location']['full_detail']
+        # if possible replace location text by corresponding flag
+        if self.location_country in country_dict:
+            self.country = country_dict[self.location_country]
+            if self.location_detail != self.location_country:
+                self.country = self.country + " " + self.location_detail.split(",")[0]
+        else:
+            self.country = self.location_detail
+            print(f"! Flag for country '{self.location_country}' not present !")
+        # get weather condition and if possible replace weather text by corresponding emoticon
+        self.weather_condition = entry['weather_condition']
+        self.weather = weather_dict.get(self.weather_condition, self.weather_condition)
+        self.temperature = entry['weather_temperature']
+        # get step description
+        self.journal = entry['description'] if entry['description'] is not None else ""
+        self.route = None  # distance, moving time and stops computed from locations.json, once the route was analyzed
+        # photos and videos are listed in the order of the directory until the trip sorts them (see Trip.sort_media),
+        # photos without EXIF offset being taken in the timezone of the step rather than the one of the trip
+        self.zone = tz.gettz(entry['timezone_id']) if entry.get('timezone_id') else None
+        self.zone = self.zone or to_zone
+        self.photos = media["photos"]
+        self.videos = media["videos"]
+        self.email_size = None  # size of photos and videos of the step email, once it was generated
+
+    # return everything displayed about the step, to detect changes between runs
+    def state(self):
+        fields = [getattr(self, name) for name in self.__slots__ if name not in ('time', 'zone', 'photos', 'videos', 'email_size')]
+        return fields + [media.state() for media in self.photos + self.videos]
+
+
+# Class describing the trip, built once from trip.json data (with photos and videos of each step) and used by all outputs
+# (the trip directory is scanned once, and the date of each photo and video is taken from the media index)
+class Trip:
+    __slots__ = ('id', 'name', 'summary', 'start_date', 'end_date', 'start_time', 'distance', 'tracked_distance', 'phone_type', 'timezone_id',
+                 'step_count', 'steps')
+
+    def __init__(self, data, original_path):
+        self.id = data['id']
+        self.name = data['name'].strip()
+        self.summary = data['summary']
+        self.start_date = datetime.datetime.fromtimestamp(data['start_date']).strftime('%Y-%m-%d')
+        if data['end_date'] is not None:
+            self.end_date = datetime.datetime.fromtimestamp(data['end_date']).strftime('%Y-%m-%d')
+        else:
+            self.end_date = "?"
+        self.distance = data['total_km']
+        self.tracked_distance = None  # distance of the route of locations.json, once the route was analyzed
+        if data['travel_tracker_device'] is not None:
+            self.phone_type = data['travel_tracker_device']['device_name']
+        else:
+            self.phone_type = "?"
+        self.timezone_id = data['timezone_id']
+        self.step_count = data['step_count']
+        to_zone = tz.gettz(self.timezone_id)
+        creation_time = datetime.datetime.fromtimestamp(data['start_date'])
+        creation_time = creation_time.replace(tzinfo=tz.gettz('UTC'))  # mark the TZ as UTC
+        self.start_time = creation_time.astimezone(to_zone)
+        with timed("media scan"):
+            step_media = scan_media(original_path)
+        self.steps = [Step(entry, number, to_zone, step_media.get(entry['id'], {"photos": [], "videos": []}))
+                      for number, entry in enumerate(data['all_steps'])]
+
+    # sort photos and videos of each step to try to retrieve PS order (when they were taken), probing their headers in bulk
+    # (only done when an output needs this order, dates or dimensions, so that text only extractions do not read media files)
+    def sort_media(self, media_index):
+        media_index.probe_all(media for step in self.steps for media in step.photos + step.videos)
+        for step in self.steps:
+            step.photos = sorted(step.photos, key=lambda m: (capture_time(m, step.zone), m.name))
+            step.videos = sorted(step.videos, key=lambda m: (capture_time(m, step.zone), m.name))
+
+
+# Function to read date (DateTimeOriginal) and orientation from the EXIF data (TIFF structure) in parameter
+def parse_exif(tiff):
+    order = "<" if tiff[:2] == b"II" else ">"
+    date = None
+    orientation = None
+    time_offset = None
+
+    # return the (tag, type, count, value or offset field) entries of the directory at the offset in parameter
+    def entries(offset):
+        count = struct.unpack_from(order + "H", tiff, offset)[0]
+        return [struct.unpack_from(order + "HHI4s", tiff, offset + 2 + 12 * i) for i in range(count)]
+
+    try:
+        for tag, kind, count, value in entries(struct.unpack_from(order + "I", tiff, 4)[0]):
+            if tag == 0x0112:  # orientation (SHORT)
+                orientation = struct.unpack_from(order + "H", value)[0]
+            elif tag == 0x8769:  # pointer to EXIF directory
+                for exif_tag, exif_kind, exif_count, exif_value in entries(struct.unpack_from(order + "I", value)[0]):
+                    if exif_tag == 0x9003 and exif_count >= 19:  # DateTimeOriginal (ASCII stored at offset)
+                        offset = struct.unpack_from(order + "I", exif_value)[0]
+                        date = tiff[offset:offset+19].decode("ascii")
+                    elif exif_tag == 0x9011 and exif_count >= 6:  # OffsetTimeOriginal (ASCII '+HH:MM' stored at offset)
+                        value_offset = struct.unpack_from(order + "I", exif_value)[0]
+                        time_offset = tiff[value_offset:value_offset+6].decode("ascii")
+    except (struct.error, UnicodeDecodeError):  # truncated or invalid EXIF data
+        pass
+    return date, orientation, time_offset if time_offset is not None and re.fullmatch(r"[+-]\d\d:\d\d", time_offset) else None
+
+
+# Function to read dimensions, EXIF date, orientation and date offset of the photo in parameter from its header only, without decoding it
+# (JPEG headers are parsed directly, other formats are read by pillow which also only reads their header)
+def probe_photo(path):
+    with storage(path).open(path) as f_in:
+        if f_in.read(2) == b"\xff\xd8":
+            width = height = date = orientation = offset = None
+            while True:
+                marker = f_in.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF or marker[1] == 0xDA:  # end of header (start of scan)
+                    break
+                length = struct.unpack(">H", f_in.read(2))[0]
+                if marker[1] == 0xE1 and date is None and orientation is None:
+                    segment = f_in.read(length - 2)
+                    if segment.startswith(b"Exif\0\0"):
+                        date, orientation, offset = parse_exif(segment[6:])
+                elif 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):  # start of frame
+                    height, width = struct.unpack(">xHH", f_in.read(5))
+                    break
+                else:
+                    f_in.seek(length - 2, 1)
+            return width, height, date, orientation, offset
+    if Image is None:
+        return None, None, None, None, None
+    with storage(path).open(path) as f_in, Image.open(f_in) as image:
+        exif = image.getexif()
+        offset = exif.get_ifd(0x8769).get(0x9011)
+        return (image.size[0], image.size[1], exif.get_ifd(0x8769).get(0x9003), exif.get(0x0112),
+                offset if isinstance(offset, str) and re.fullmatch(r"[+-]\d\d:\d\d", offset) else None)
+
+
+# Function to read the creation time (UTC, as 'YYYY:MM:DD HH:MM:SS') of the MP4/MOV video in parameter from its mvhd box,
+# skipping media data boxes without reading them
+def probe_video(path):
+    with storage(path).open(path) as f_in:
+        end = storage(path).stat(path)[0]
+        while f_in.tell() + 8 <= end:
+            start = f_in.tell()
+            size, kind = struct.unpack(">I4s", f_in.read(8))
+            if size == 1:  # 64 bits size
+                size = struct.unpack(">Q", f_in.read(8))[0]
+            elif size == 0:  # box up to the end of the file
+                size = end - start
+            if kind == b"moov":  # look for mvhd inside the movie box
+                end = start + size
+                continue
+            if kind == b"mvhd":
+                version = f_in.read(4)[0]
+                seconds = struct.unpack(">Q" if version == 1 else ">I", f_in.read(8 if version == 1 else 4))[0]
+                if seconds == 0:  # creation time not set
+                    return None
+                return (datetime.datetime(1904, 1, 1) + datetime.timedelta(seconds=seconds)).strftime("%Y:%m:%d %H:%M:%S")
+            if size < 8:  # invalid box
+                return None
+            f_in.seek(start + size)
+    return None
+
+
+# Class keeping dimensions, EXIF date and orientation of photos (and creation time of videos) in a metadata index between runs
+# (Extracts/media_index.json), so that files are only probed once
+class MediaIndex:
+    def __init__(self, path, base_path):
+        self.path = path
+        self.base_path = base_path  # index entries are identified by path relative to the trip directory
+        self.lock = threading.Lock()
+        self.entries = load_json(path, {})
+        self.probed = 0
+
+    # set dimensions, date and orientation of the media in parameter, from the index if the file did not change since it was probed
+    def probe(self, media):
+        key = os.path.relpath(media.path, self.base_path).replace(os.sep, "/")
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry[:2] != [media.size, media.mtime_ns]:
+            with timed("media probe"):
+                try:
+                    if media.kind == "videos":
+                        metadata = [None, None, probe_video(media.path), None, None]
                     else:
-                        new_total_size = new_total_size + initial_size
-                    if verbose:
-                        text += ")\n"
-                    if (mail or interactive):
-                        msg.add_attachment(cfile.read_bytes(), maintype=maintype, subtype=subtype, filename=f"img_{step_id}_{photo+1}")
-            # parse videos
-            if videos_nbr > 0:
-                for video, f in enumerate(sorted_videos):
-                    cfile = Path(os.path.join(os.getcwd(), f"{step_slug}_{step_id}", "videos", f))
-                    initial_size = cfile.stat().st_size
-                    if verbose:
-                        text += f"Video {video+1}: {f} ({round(initial_size/1024/102.4)/10}Mb)\n"
-                    ctype, encoding = mimetypes.guess_type(cfile)
-                    if ctype is None or encoding is not None:
-                        ctype = 'video/mp4'
-                    maintype, subtype = ctype.split('/', 1)
-                    total_size = total_size + initial_size
-                    new_total_size = new_total_size + initial_size
-                    if local:  # add video (in gallery mode) to the step html file and previous/next links
-                        step_file.write(f"<a href=\"#vid{video+1}\"><video class=\"thumb-vid\" src=\"..\\{step_slug}_{step_id}\\videos\\{f}\"></video></a>\n")
-                        step_file.write(f"<div class=\"lightbox\" id=\"vid{video+1}\">\n")
-                        if video > 0:
-                            step_file.write(f"<a href=\"#vid{video}\" class=\"light-btn btn-prev\"><</a>\n")
-                        else:
-                            if step_image == "":
-                                step_image = f"..\\{step_slug}_{step_id}\\videos\\{f}"
-                            if photos_nbr > 0:
-                                step_file.write(f"<a href=\"#img{photos_nbr}\" class=\"light-btn btn-prev\"><</a>\n")
-                        step_file.write(f"<a href=\"#_\" class=\"btn-close\">X</a>\n<video controls src=\"..\\{step_slug}_{step_id}\\videos\\{f}\"></video>\n")
-                        if video+1 < videos_nbr:
-                            step_file.write(f"<a href=\"#vid{video+2}\" class=\"light-btn btn-next\">></a>\n</div>\n")
-                        else:
-                            step_file.write(f"</div>\n")
-                    if (mail or interactive):
-                        msg.add_attachment(cfile.read_bytes(), maintype=maintype, subtype=subtype, filename=f"vid_{step_id}_{video+1}")
-            text += f"{photos_nbr} photo(s), {videos_nbr} video(s) ({round(total_size/1024/102.4)/10}Mb"
-            if (mail or interactive):
-                text += f" compressible to {round(new_total_size/1024/102.4)/10}Mb"
-            text += ")\n____________________\n"
-            if interactive:
-                print(text)
-            f_out.write(f"{text}\n")
-            # if interactive mode is active, it will ask what to do for each step
-            if interactive:
-                action = input(f"--> Action for step {step_num+1} [{step_name}] ? (s)kip (default), (e)mail, (q)uit ? ")
-                if action == "q" or action == "quit":
-                    print("...exiting")
-                    return
-                elif action == "e" or action == "email":
-                    print("...mailing this step")
-                    email(msg)
-                elif action == "s" or action == "skip" or action == "":
-                    print("...jumping to next step")
+                        metadata = list(probe_photo(media.path))
+                except Exception as e:  # file format not supported by pillow for example
+                    print(f"! Metadata of {media.name} could not be read ({e}).")
+                    metadata = [None, None, None, None, None]
+            entry = [media.size, media.mtime_ns] + metadata
+            with self.lock:
+                self.entries[key] = entry
+                self.probed += 1
+                add_count("media probed")
+        media.width, media.height, media.date, media.orientation, media.offset = entry[2:]
+        return media
+
+    # probe the media in parameter in bulk, with several threads for media not already in the index
+    def probe_all(self, media_list):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(4, workers)) as executor:
+            list(executor.map(self.probe, media_list))
+
+    # save the index if media were probed during the run
+    def save(self):
+        with self.lock:
+            if self.probed > 0:
+                save_json(self.path, self.entries)
+
+
+# Class keeping information between runs in manifest.json (fingerprints of pages and maps written, steps already emailed)
+# (shared by outputs running in several threads, so it is only read and modified under a lock)
+class Manifest:
+    def __init__(self, path, step_ids):
+        self.path = path
+        self.lock = threading.Lock()
+        self.content = load_json(path, {})
+        previous_steps = self.content.get('steps', {})
+        self.content['steps'] = {str(step_id): previous_steps.get(str(step_id), {}) for step_id in step_ids}
+        self.content.setdefault('maps', {})
+
+    # return the value stored under the keys in parameter (for example ('steps', step_id, 'page')), or default if missing
+    def get(self, keys, default=None):
+        with self.lock:
+            value = self.content
+            for key in keys:
+                value = value.get(str(key)) if isinstance(value, dict) else None
+            return default if value is None else value
+
+    def set(self, keys, value):
+        with self.lock:
+            content = self.content
+            for key in keys[:-1]:
+                content = content.setdefault(str(key), {})
+            content[str(keys[-1])] = value
+
+    def save(self):
+        with self.lock:
+            write_file(self.path, json.dumps(self.content))
+
+
+# Class rendering static maps in worker processes, only when their content changed since last run
+class MapRenderer:
+    def __init__(self, executor, extract_dir, manifest):
+        self.executor = executor
+        self.extract_dir = extract_dir
+        self.manifest = manifest
+        self.futures = {}  # (future, fingerprint) of maps being rendered, by name
+
+    def submit(self, name, style, width, height, markers=(), lines=(), zoom=None):
+        map_path = os.path.join(self.extract_dir, name)
+        fingerprint = hashlib.sha1(json.dumps([style, width, height, markers, lines, zoom, map_tiles]).encode("utf-8")).hexdigest()
+        if force or self.manifest.get(('maps', name)) != fingerprint or not os.path.exists(map_path):
+            self.futures[name] = (self.executor.submit(render_map, map_path, style, width, height, markers, lines, zoom,
+                                                       tiles_cache or os.path.join(self.extract_dir, "tiles"), map_tiles), fingerprint)
+
+    # wait for the map in parameter, returning its path (or None if it could not be generated)
+    def wait(self, name):
+        map_path = os.path.join(self.extract_dir, name)
+        if name in self.futures:
+            future, fingerprint = self.futures.pop(name)
+            try:
+                with timed("maps"):
+                    add_time("map rendering (workers)", future.result())
+                add_count("maps rendered")
+                self.manifest.set(('maps', name), fingerprint)
+            except Exception as e:  # tiles could not be downloaded for example
+                print(f"! Map {name} could not be generated ({e}).")
+                return None
+        return map_path if os.path.exists(map_path) else None
+
+    # wait for all maps not used yet
+    def finish(self):
+        for name in list(self.futures):
+            self.wait(name)
+
+    def cancel(self):
+        for future, fingerprint in self.futures.values():
+            future.cancel()
+
+
+# Class transcoding videos in worker processes to smaller versions used by emails and html pages, kept in Extracts/videos between runs
+# (named by the fingerprint of the original video, so that each video is only transcoded once)
+class VideoTranscoder:
+    def __init__(self, executor, extract_dir, base_path):
+        self.executor = executor
+        self.directory = os.path.join(extract_dir, "videos")
+        self.base_path = base_path  # videos are identified by path relative to the trip directory
+        self.lock = threading.Lock()
+        self.futures = {}  # future of videos being transcoded, by path of the original video
+        self.results = {}  # path of the transcoded version (None if not smaller than the original), by path of the original video
+
+    # return the path of the transcoded version of the video in parameter (videos with the same name in several steps have their own version)
+    def video_path(self, media):
+        key = os.path.relpath(media.path, self.base_path).replace(os.sep, "/")
+        ident = f"{key}|{media.size}|{media.mtime_ns}|{video_height}|{video_quality}"
+        return os.path.join(self.directory, f"{hashlib.sha1(ident.encode('utf-8')).hexdigest()}.mp4")
+
+    def submit(self, media):
+        if not os.path.exists(self.video_path(media)):
+            self.futures[media.path] = self.executor.submit(transcode_video, media.path, self.video_path(media), video_height, video_quality)
+
+    # wait for the transcoded version of the video in parameter (several outputs can wait for the same video),
+    # returning its path if it is smaller than the original video, or None
+    def wait(self, media):
+        future = self.futures.get(media.path)
+        try:
+            worker_time = future.result() if future is not None else 0
+            error = None
+        except Exception as e:  # video format not supported by ffmpeg for example
+            worker_time = 0
+            error = e
+        with self.lock:
+            if media.path not in self.results:
+                video_path = self.video_path(media)
+                if error is not None:
+                    print(f"! Video {media.name} could not be transcoded ({error}).")
+                add_time("video transcoding (workers)", worker_time)
+                if future is not None and error is None:
+                    add_count("videos transcoded")
+                if error is None and os.path.exists(video_path) and os.path.getsize(video_path) < media.size:
+                    media.resized_size = os.path.getsize(video_path)
+                    self.results[media.path] = video_path
+                else:  # the original video is used
+                    self.results[media.path] = None
+            return self.results[media.path]
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+
+# Function to return the text describing the trip at the beginning of the .txt file
+def trip_text(trip):
+    text = f"Trip Name: {trip.name}\n{trip.summary}\n"
+    text += f"Start Date: {trip.start_date}\nEnd Date: {trip.end_date}\n"
+    text += f"Total Distance: {round(trip.distance)}(km) in {trip.step_count} steps\n"
+    if trip.tracked_distance is not None:
+        text += f"Tracked Distance: {round(trip.tracked_distance)}(km)\n"
+    if verbose:
+        text += f"User Timezone: {trip.timezone_id}\nRecording Device: {trip.phone_type}\n"
+    text += "____________________\n"
+    return text
+
+
+# Function to return the duration in seconds in parameter as text (45min, 2h05)
+def duration_text(seconds):
+    minutes = round(seconds / 60)
+    return f"{minutes}min" if minutes < 60 else f"{minutes // 60}h{minutes % 60:02d}"
+
+
+# Function to return the text describing route statistics of a step (distance, moving time and stops)
+def route_text(route):
+    text = f"{route['distance']}km, moving {duration_text(route['moving'])}"
+    if route['stops'] > 0:
+        text += f", {route['stops']} stop(s) ({duration_text(route['stopped'])})"
+    return text
+
+
+# Function to return the text describing the step in the .txt file (with sizes of resized photos once the step email was generated)
+def step_text(step):
+    text = f"Step: {step.name}\n"
+    if verbose:
+        text += f"Step Id: {step.id}, Slug: {step.slug}\n"
+    text += f"Date: {step.time.strftime('%Y-%m-%d %H:%M')}\n"
+    if step.route is not None:
+        text += f"Route: {route_text(step.route)}\n"
+    if verbose:
+        text += f"Location: {step.country} {step.location_name} ({step.lat},{step.lon} - {step.location_detail})"
+    text += f"\nWeather: {step.weather_condition}, Temperature: {step.temperature}°C\n\n"
+    text += f"{step.journal}\n\n"
+    if verbose:
+        for photo, media in enumerate(step.photos):
+            text += f"Photo {photo+1}: {media.name} ({round(media.size/1024/102.4)/10}Mb"
+            if media.resized_size is not None:
+                text += f" compressible to {round(media.resized_size/1024/102.4)/10}Mb"
+            text += ")\n"
+        for video, media in enumerate(step.videos):
+            text += f"Video {video+1}: {media.name} ({round(media.size/1024/102.4)/10}Mb"
+            if media.resized_size is not None:
+                text += f" transcoded to {round(media.resized_size/1024/102.4)/10}Mb"
+            text += ")\n"
+    total_size = sum(media.size for media in step.photos + step.videos)
+    text += f"{len(step.photos)} photo(s), {len(step.videos)} video(s) ({round(total_size/1024/102.4)/10}Mb"
+    if step.email_size is not None:
+        text += f" compressible to {round(step.email_size/1024/102.4)/10}Mb"
+    text += ")\n____________________\n"
+    return text
+
+
+# Class of outputs generated from the trip model; sinks run concurrently in threads, except the ones which have to run
+# in the main thread one after the other (to ask questions, or to use results of a previous sink)
+class Sink:
+    main_thread = False
+    sorted_media = True  # photos and videos of steps are used in the order they were taken (see Trip.sort_media)
+    progress = None  # live progress line shared by all outputs with the profile option
+
+    def __init__(self, trip, extract_dir, manifest):
+        self.trip = trip
+        self.extract_dir = extract_dir
+        self.manifest = manifest
+
+    # count the step in parameter as generated by the output
+    def step_done(self, step):
+        if self.progress is not None:
+            self.progress.advance(sum(media.size for media in step.photos + step.videos))
+
+    # generate the output, returning False if the extraction should stop (interactive quit)
+    def run(self):
+        raise NotImplementedError
+
+
+# Class writing the .txt file describing the trip and its steps
+class TextSink(Sink):
+    def __init__(self, trip, extract_dir, manifest, videos=None):
+        super().__init__(trip, extract_dir, manifest)
+        self.main_thread = mail or interactive  # sizes of resized photos are known once the email sink ran
+        self.sorted_media = verbose  # photos and videos are only listed in verbose mode
+        self.path = os.path.join(extract_dir, f"{trip.name}_{trip.start_date}.txt")
+        self.videos = videos
+
+    def run(self):
+        if self.videos is not None:  # sizes of transcoded videos are known once they are transcoded
+            with timed("videos"):
+                for step in self.trip.steps:
+                    for media in step.videos:
+                        self.videos.wait(media)
+        text = trip_text(self.trip) + "\n"
+        for step in self.trip.steps:
+            text += f"{step_text(step)}\n"
+            self.step_done(step)
+        write_file(self.path, text)
+        return True
+
+
+# Class writing the .json file describing the trip and its steps (to be used by other programs)
+class JsonSink(Sink):
+    def run(self):
+        trip = self.trip
+        content = {'name': trip.name, 'summary': trip.summary, 'start_date': trip.start_date, 'end_date': trip.end_date,
+                   'distance': trip.distance, 'timezone': trip.timezone_id, 'steps': []}
+        for step in trip.steps:
+            content['steps'].append({
+                'id': step.id, 'name': step.name, 'slug': step.slug, 'time': step.time.isoformat(),
+                'location': {'name': step.location_name, 'lat': step.lat, 'lon': step.lon, 'country': step.location_country, 'detail': step.location_detail},
+                'weather': step.weather_condition, 'temperature': step.temperature, 'description': step.journal, 'route': step.route,
+                'photos': [{'name': media.name, 'size': media.size} for media in step.photos],
+                'videos': [{'name': media.name, 'size': media.size} for media in step.videos]})
+            self.step_done(step)
+        write_file(os.path.join(self.extract_dir, f"{trip.name}_{trip.start_date}.json"), json.dumps(content, ensure_ascii=False, indent=1))
+        return True
+
+
+# Class indexing steps, media and locations of the trip in an SQLite database shared by all trips and runs (to be queried with SQL),
+# rows of a step being only replaced when the step changed since it was indexed, in one transaction per trip
+class DatabaseSink(Sink):
+    schema = """
+        CREATE TABLE IF NOT EXISTS trips (id INTEGER PRIMARY KEY, name TEXT, summary TEXT, start_date TEXT, end_date TEXT,
+                                          distance REAL, timezone TEXT, path TEXT, locations_state TEXT);
+        CREATE TABLE IF NOT EXISTS steps (id INTEGER PRIMARY KEY, trip_id INTEGER, number INTEGER, name TEXT, slug TEXT, time REAL, date TEXT,
+                                          location TEXT, lat REAL, lon REAL, country TEXT, detail TEXT, weather TEXT, temperature REAL,
+                                          description TEXT, state TEXT);
+        CREATE TABLE IF NOT EXISTS media (id INTEGER PRIMARY KEY, step_id INTEGER, kind TEXT, name TEXT, path TEXT, size INTEGER,
+                                          mtime_ns INTEGER, time REAL, width INTEGER, height INTEGER, orientation INTEGER);
+        CREATE TABLE IF NOT EXISTS locations (id INTEGER PRIMARY KEY, trip_id INTEGER, time REAL, lat REAL, lon REAL);
+        CREATE INDEX IF NOT EXISTS steps_trip ON steps (trip_id, time);
+        CREATE INDEX IF NOT EXISTS steps_time ON steps (time);
+        CREATE INDEX IF NOT EXISTS steps_country ON steps (country);
+        CREATE INDEX IF NOT EXISTS media_step ON media (step_id);
+        CREATE INDEX IF NOT EXISTS media_size ON media (size);
+        CREATE INDEX IF NOT EXISTS media_time ON media (time);
+        CREATE INDEX IF NOT EXISTS locations_trip ON locations (trip_id, time);
+        CREATE INDEX IF NOT EXISTS locations_time ON locations (time);
+    """
+    # (paths of media are relative to the trip directory, coordinates of steps and locations are indexed by R-trees with a zero sized box)
+    rtree_schema = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS steps_rtree USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+        CREATE VIRTUAL TABLE IF NOT EXISTS locations_rtree USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+    """
+
+    def __init__(self, trip, extract_dir, manifest, track, path):
+        super().__init__(trip, extract_dir, manifest)
+        self.track = track
+        self.path = path
+
+    # return a fingerprint of the locations of the trip, to detect changes between runs
+    def locations_state(self):
+        if self.track is None:
+            return ""
+        fingerprint = hashlib.sha1()
+        for column in (self.track.time, self.track.lat, self.track.lon):
+            fingerprint.update(column.tobytes())
+        return fingerprint.hexdigest()
+
+    def run(self):
+        trip = self.trip
+        # several trips may be indexed at the same time by batch worker processes, so connection waits for the database to be free
+        connection = sqlite3.connect(self.path, timeout=300, isolation_level=None)
+        try:
+            with timed("database"):
+                connection.executescript(self.schema)
+                try:
+                    connection.executescript(self.rtree_schema)
+                    rtree = True
+                except sqlite3.OperationalError:  # SQLite compiled without R-tree module, coordinates are not indexed
+                    print("! R-tree module of SQLite not available, coordinates are not indexed.")
+                    rtree = False
+                connection.execute("BEGIN IMMEDIATE")
+                indexed_steps = dict(connection.execute("SELECT id, state FROM steps WHERE trip_id = ?", (trip.id,)))
+                trip_row = connection.execute("SELECT locations_state FROM trips WHERE id = ?", (trip.id,)).fetchone()
+                # steps are replaced (with their media) when their content changed, steps removed from the trip are deleted
+                step_rows, media_rows = [], []
+                for step in trip.steps:
+                    state = hashlib.sha1(json.dumps(step.state(), ensure_ascii=False).encode("utf-8")).hexdigest()
+                    if force or indexed_steps.pop(step.id, None) != state:
+                        step_rows.append((step.id, trip.id, step.number, step.name, step.slug, step.start_time, step.date, step.location_name,
+                                          step.lat, step.lon, step.location_country, step.location_detail, step.weather_condition,
+                                          step.temperature, step.journal, state))
+                        media_rows += [(step.id, media.kind, media.name, f"{step.slug}_{step.id}/{media.kind}/{media.name}", media.size, media.mtime_ns, capture_time(media, step.zone),
+                                        media.width, media.height, media.orientation) for media in step.photos + step.videos]
+                    self.step_done(step)
+                stale = [(step_id,) for step_id in list(indexed_steps) + [step_row[0] for step_row in step_rows]]
+                connection.executemany("DELETE FROM steps WHERE id = ?", stale)
+                connection.executemany("DELETE FROM media WHERE step_id = ?", stale)
+                connection.executemany("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", step_rows)
+                connection.executemany("INSERT INTO media (step_id, kind, name, path, size, mtime_ns, time, width, height, orientation) "
+                                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", media_rows)
+                if rtree:
+                    connection.executemany("DELETE FROM steps_rtree WHERE id = ?", stale)
+                    connection.executemany("INSERT INTO steps_rtree VALUES (?, ?, ?, ?, ?)",
+                                           ((step_row[0], step_row[8], step_row[8], step_row[9], step_row[9]) for step_row in step_rows))
+                # locations are replaced when locations.json changed
+                locations_state = self.locations_state()
+                locations_nbr = 0
+                if force or trip_row is None or trip_row[0] != locations_state:
+                    if rtree:
+                        connection.execute("DELETE FROM locations_rtree WHERE id IN (SELECT id FROM locations WHERE trip_id = ?)", (trip.id,))
+                    connection.execute("DELETE FROM locations WHERE trip_id = ?", (trip.id,))
+                    if self.track is not None and len(self.track) > 0:
+                        first_id = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM locations").fetchone()[0]
+                        ids = range(first_id, first_id + len(self.track))
+                        connection.executemany("INSERT INTO locations VALUES (?, ?, ?, ?, ?)",
+                                               zip(ids, itertools.repeat(trip.id), self.track.time, self.track.lat, self.track.lon))
+                        if rtree:
+                            connection.executemany("INSERT INTO locations_rtree VALUES (?, ?, ?, ?, ?)",
+                                                   zip(ids, self.track.lat, self.track.lat, self.track.lon, self.track.lon))
+                        locations_nbr = len(self.track)
+                connection.execute("INSERT OR REPLACE INTO trips VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (trip.id, trip.name, trip.summary, trip.start_date, trip.end_date, trip.distance, trip.timezone_id,
+                                    os.path.dirname(self.extract_dir), locations_state))
+                connection.execute("COMMIT")
+        finally:
+            connection.close()
+        add_count("database rows written", len(step_rows) + len(media_rows) + locations_nbr)
+        print(f"{len(step_rows)} step(s) and {locations_nbr} location(s) written in {self.path}, {len(trip.steps) - len(step_rows)} unchanged since last run.")
+        return True
+
+
+# Class writing local html pages (index.htm and one page per step), with thumbnails generated in worker processes
+class HtmlSink(Sink):
+    def __init__(self, trip, extract_dir, manifest, executor, track, videos=None):
+        super().__init__(trip, extract_dir, manifest)
+        self.executor = executor if Image is not None else None
+        self.track = track
+        self.videos = videos
+        self.thumb_futures = {}  # thumbnails and screen sized copies of photos, and poster frames of videos being generated
+
+    # return paths of the thumbnail, screen sized copy and poster frame of the media in parameter (named after the whole file name,
+    # so that photos and videos of a step with the same name but another extension do not share them)
+    def thumb_paths(self, step, media):
+        return tuple(os.path.join(self.extract_dir, "thumbs", str(step.id), f"{media.name}_{kind}.jpg") for kind in ("thumb", "screen", "poster"))
+
+    # start generating the derived files of photos and videos which are outdated
+    def submit_thumbs(self):
+        for step in self.trip.steps:
+            for media in step.photos:
+                thumb_path, screen_path, poster_path = self.thumb_paths(step, media)
+                if force or outdated(media.path, thumb_path) or outdated(media.path, screen_path):
+                    self.thumb_futures[media.path] = self.executor.submit(make_thumbnails, media.path, thumb_path, screen_path, thumb_height, screen_size)
+            for media in step.videos if ffmpeg_path else []:
+                thumb_path, screen_path, poster_path = self.thumb_paths(step, media)
+                if force or outdated(media.path, poster_path):
+                    self.thumb_futures[media.path] = self.executor.submit(make_poster, media.path, poster_path, thumb_height)
+
+    # wait for the derived files of the media in parameter, returning True if they are available
+    def wait_thumbs(self, media):
+        if media.path in self.thumb_futures:
+            try:
+                with timed("thumbnails"):
+                    add_time("thumbnail generation (workers)", self.thumb_futures.pop(media.path).result())
+                add_count("thumbnails generated")
+            except Exception as e:  # file format not supported by pillow for example
+                print(f"! Thumbnail of {media.name} could not be generated ({e}).")
+                return False
+        return True
+
+    # return the link to the original photo or video in parameter, extracted next to the Extracts directory when read from a zip file
+    def original(self, step, media):
+        link = f"..\\{step.slug}_{step.id}\\{media.kind}\\{media.name}"
+        store = storage(media.path)
+        if store is not dir_storage:
+            copy_path = os.path.join(os.path.dirname(self.extract_dir), f"{step.slug}_{step.id}", media.kind, media.name)
+            if force or outdated(media.path, copy_path):
+                with timed("zip extraction"):
+                    Path(copy_path).parent.mkdir(parents=True, exist_ok=True)
+                    with store.open(media.path) as f_in, open(f"{copy_path}.tmp", 'wb') as f_out:
+                        shutil.copyfileobj(f_in, f_out, 1024*1024)
+                    os.replace(f"{copy_path}.tmp", copy_path)
+        return link
+
+    def run(self):
+        trip = self.trip
+        # create css file and index.htm content (written once all steps are known, in pages of index_page_size steps),
+        # pages are written by a thread pool
+        write_file(os.path.join(self.extract_dir, "local.css"), css_text)
+        index_page = {'title': trip.name, 'intro': f"{trip.summary}, {round(trip.distance)}km, {trip.step_count} steps, {trip.start_date}-{trip.end_date}",
+                      'steps': [], 'route': ""}
+        page_writer = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        page_futures = []
+        script_hash = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+        pages_written = 0
+        pages_unchanged = 0
+        if self.executor is not None:
+            self.submit_thumbs()
+        for step in trip.steps:
+            step_file_path = os.path.join(self.extract_dir, f"{step.id}.htm")
+            intro = f"{step.country} {step.location_name} \U0001F538 {step.date} \U0001F538 {step.weather}"
+            if step.temperature is not None:
+                intro += f" {int(step.temperature)}°C"
+            if step.route is not None:
+                intro += f" \U0001F538 {route_text(step.route)}"
+            index_link = f"{index_page_name(step.number)}#s{step.id}"
+            step_page = {'title': step.name, 'intro': intro, 'lat': step.lat, 'lon': step.lon, 'id': step.id,
+                         'trip_name': trip.name, 'index_link': index_link, 'gallery': [], 'previous': "", 'next': ""}
+            step_image = ""
+            step_image_video = False  # first media of the step is a video without poster frame, played in index.htm
+            derivatives = []  # media displayed with their thumbnail, screen sized copy or poster in the step page
+            photos_nbr = len(step.photos)
+            videos_nbr = len(step.videos)
+            # add photos (in gallery mode) to the step page and previous/next links
+            for photo, media in enumerate(step.photos):
+                # thumbnail and screen sized copy are displayed when generated (original photo is only loaded on high density screens,
+                # photos read from a zip file are not extracted when their screen sized copy is available)
+                if self.executor is not None and self.wait_thumbs(media):
+                    thumb, screen = (os.path.relpath(p, self.extract_dir).replace("/", "\\") for p in self.thumb_paths(step, media)[:2])
+                    original = self.original(step, media) if storage(media.path) is dir_storage else screen
+                    derivatives.append(media.name)
+                else:
+                    original = self.original(step, media)
+                    thumb, screen = original, original
+                media_page = {'template': 'photo', 'number': photo+1, 'thumb': thumb, 'screen': screen, 'previous': "", 'next': "",
+                              'srcset': f" srcset=\"{screen} 1x, {original} 2x\"" if screen != original else ""}
+                if photo > 0:
+                    media_page['previous'] = f"<a href=\"#img{photo}\" class=\"light-btn btn-prev\"><</a>\n"
                 else:
-                    print("...resuming")
-                    if mail:
-                        email(msg)
-            elif mail:
-                email(msg)
-            # Append step coordinates for index map
-            step_coords.append({
-                'lat': location_lat,
-                'lon': location_lon,
-                'name': step_name.replace("'", "\\'"),
-                'date': adjusted_date.replace("'", "\\'"),
-                'id': step_id  # Add step_id to use in the marker link
-            })
-            if local:
-                if photos_nbr > 0:
-                    index_file.write(f"<img class=\"thumb\" src=\"{step_image}\">\n")
+                    step_image = thumb
+                if photo+1 < photos_nbr:
+                    media_page['next'] = f"<a href=\"#img{photo+2}\" class=\"light-btn btn-next\">></a>\n"
                 elif videos_nbr > 0:
-                    index_file.write(f"<video controls class=\"thumb\" src=\"{step_image}\">\n")
-                index_file.write(f"</a><br>\n")
-                step_file.write(f"<p class=\"footer\">\n")
-                if step_num > 0:
-                    step_file.write(f"< <a href=\"{data['all_steps'][step_num-1]['id']}.htm\">{data['all_steps'][step_num-1]['display_name']}</a> | ")
-                step_file.write(f"<a href=\"index.htm\">{trip_name}</a>")
-                if step_num < total_entries-1:
-                    step_file.write(f" | <a href=\"{data['all_steps'][step_num+1]['id']}.htm\">{data['all_steps'][step_num+1]['display_name']}</a> >")
-                step_file.write(f"</p>\n</body>\n")
-                step_file.close()
-        # close .txt file
-        f_out.close()
-        tmp_img_path = os.path.join(extract_dir, 'tmp.jpg')
-        if os.path.exists(tmp_img_path):
-            os.remove(tmp_img_path)
+                    media_page['next'] = f"<a href=\"#vid1\" class=\"light-btn btn-next\">></a>\n"
+                step_page['gallery'].append(media_page)
+            # add videos (in gallery mode) to the step page and previous/next links
+            for video, media in enumerate(step.videos):
+                # poster frame is displayed instead of the video when generated (video is only loaded when played)
+                video_path = None
+                if self.videos is not None:  # smaller transcoded version played instead of the original video
+                    with timed("videos"):
+                        video_path = self.videos.wait(media)
+                if video_path is not None:
+                    src = os.path.relpath(video_path, self.extract_dir).replace("/", "\\")
+                    derivatives.append(os.path.basename(video_path))
+                else:
+                    src = self.original(step, media)
+                media_page = {'template': 'video', 'number': video+1, 'src': src, 'previous': "", 'next': ""}
+                if self.executor is not None and ffmpeg_path and self.wait_thumbs(media):
+                    poster = os.path.relpath(self.thumb_paths(step, media)[2], self.extract_dir).replace("/", "\\")
+                    derivatives.append(media.name)
+                    media_page['thumb'] = f"<img class=\"thumb-vid\" loading=\"lazy\" src=\"{poster}\">"
+                    media_page['attributes'] = f" preload=\"none\" poster=\"{poster}\""
+                else:
+                    poster = ""
+                    media_page['thumb'] = f"<video class=\"thumb-vid\" preload=\"metadata\" src=\"{src}\"></video>"
+                    media_page['attributes'] = " preload=\"none\""
+                if video > 0:
+                    media_page['previous'] = f"<a href=\"#vid{video}\" class=\"light-btn btn-prev\"><</a>\n"
+                else:
+                    if step_image == "":
+                        step_image = poster or src
+                        step_image_video = not poster
+                    if photos_nbr > 0:
+                        media_page['previous'] = f"<a href=\"#img{photos_nbr}\" class=\"light-btn btn-prev\"><</a>\n"
+                if video+1 < videos_nbr:
+                    media_page['next'] = f"<a href=\"#vid{video+2}\" class=\"light-btn btn-next\">></a>\n"
+                step_page['gallery'].append(media_page)
+            # add step to index.htm and links to previous and next steps to the step page
+            index_step = {'template': 'index_step', 'name': step.name, 'date': step.date, 'id': step.id, 'image': ""}
+            if step_image_video:
+                index_step['image'] = f"<video controls class=\"thumb\" preload=\"none\" src=\"{step_image}\">\n"
+            elif step_image:
+                index_step['image'] = f"<img class=\"thumb\" loading=\"lazy\" src=\"{step_image}\">\n"
+            index_page['steps'].append(index_step)
+            prev_step = trip.steps[step.number-1] if step.number > 0 else None
+            next_step = trip.steps[step.number+1] if step.number < len(trip.steps)-1 else None
+            if prev_step is not None:
+                step_page['previous'] = f"< <a href=\"{prev_step.id}.htm\">{prev_step.name}</a> | "
+            if next_step is not None:
+                step_page['next'] = f" | <a href=\"{next_step.id}.htm\">{next_step.name}</a> >"
+            # write step page only if something used to generate it changed since last run
+            page_fingerprint = step_fingerprint(step, prev_step, next_step, trip.name, script_hash, derivatives, index_link)
+            if force or self.manifest.get(('steps', step.id, 'page')) != page_fingerprint or not os.path.exists(step_file_path):
+                page_futures.append(page_writer.submit(write_page, step_file_path, 'step', step_page))
+                self.manifest.set(('steps', step.id, 'page'), page_fingerprint)
+                pages_written += 1
+            else:
+                pages_unchanged += 1
+            self.step_done(step)
+        add_count("pages written", pages_written)
+        print(f"{pages_written} step page(s) written, {pages_unchanged} unchanged since last run.")
 
-        if local:
-            # Prepare route coordinates from locations.json
-            route_coords = []
-            if loc_data and 'locations' in loc_data:
-                sorted_locs = sorted(loc_data['locations'], key=lambda x: x['time'])
-                for loc in sorted_locs:
-                    lat = loc['lat']
-                    lon = loc['lon']
-                    route_coords.append([lat, lon])
+        # Prepare route coordinates from locations.json (already sorted by time), simplified if requested
+        route_levels = []
+        track = self.track
+        if track is not None and len(track) > 0:
+            if route_tolerance > 0 or route_points > 0:
+                with timed("route simplification"):
+                    route_levels = track.simplify(route_tolerance, route_points)
+                kept = len(route_levels[0][1])
+                print(f"Route simplified from {len(track)} to {kept} locations ({round(100 - 100 * kept / len(track))}% removed, {len(route_levels)} level(s) of detail).")
             else:
-                print("! No location data available for route.")
-            # add map to local index html file and close it
-            index_file.write("<script>\n")
-            index_file.write("    var mymap = L.map('mapid');\n")
-            index_file.write("    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {\n")
-            index_file.write("        attribution: 'Map data © <a href=\"https://openstreetmap.org\">OpenStreetMap</a> contributors'\n")
-            index_file.write("    }).addTo(mymap);\n")
-            index_file.write("    var markers = ")
-            index_file.write(json.dumps(step_coords))
-            index_file.write(";\n")
-            index_file.write("    var markerGroup = L.featureGroup();\n")
-            index_file.write("    markers.forEach(function(marker, index) {\n")
-            index_file.write("        var number = index + 1;\n")
-            index_file.write("        var myIcon = L.divIcon({\n")
-            index_file.write("            className: 'numbered-marker',\n")
-            index_file.write("            html: '<div class=\"marker-circle\">' + number + '</div>',\n")
-            index_file.write("            iconSize: [30, 30],\n")
-            index_file.write("            iconAnchor: [15, 30],\n")
-            index_file.write("            popupAnchor: [0, -30]\n")
-            index_file.write("        });\n")
-            index_file.write("        var m = L.marker([marker.lat, marker.lon], {icon: myIcon});\n")
-            index_file.write("        m.bindPopup('<b><a href=\"' + marker.id + '.htm\">' + marker.name + '</a></b><br>' + marker.date);\n")
-            index_file.write("        m.on('click', function() {\n")
-            index_file.write("            window.location.href = marker.id + '.htm';\n")
-            index_file.write("        });\n")
-            index_file.write("        markerGroup.addLayer(m);\n")
-            index_file.write("    });\n")
-            index_file.write("    markerGroup.addTo(mymap);\n")
-            index_file.write("    mymap.fitBounds(markerGroup.getBounds());\n")
-            # Add route polyline if available
-            if route_coords:
-                index_file.write("    var route = ")
-                index_file.write(json.dumps(route_coords))
-                index_file.write(";\n")
-                index_file.write("    var polyline = L.polyline(route, {color: 'blue'}).addTo(mymap);\n")
+                route_levels = [(0, range(len(track)))]
+        else:
+            print("! No location data available for route.")
+        # write steps and route in trip_data.js file shared by all pages
+        write_trip_data(os.path.join(self.extract_dir, "trip_data.js"), trip.steps, track, route_levels)
+        with timed("search index"):
+            write_search_index(os.path.join(self.extract_dir, "search"), trip.steps)
+        # render index.htm with the map of all steps and the route, then wait for all pages to be written
+        if route_levels:
+            index_page['route'] = html_templates['route'].substitute()
+        else:
+            print("! No route data to display.")
+        # split steps of index.htm in pages (each one displaying the map of all steps, linking to other pages) and remove pages not used anymore
+        page_size = index_page_size if index_page_size > 0 else max(1, len(trip.steps))
+        page_steps = [index_page['steps'][first:first+page_size] for first in range(0, len(trip.steps), page_size)] or [[]]
+        ranges = [f"{steps[0]['date']} - {steps[-1]['date']}" if steps else "" for steps in page_steps]
+        for page, steps in enumerate(page_steps):
+            pages = ""
+            if len(page_steps) > 1:
+                links = [f"<b title=\"{ranges[other]}\">{other+1}</b>" if other == page else
+                         f"<a href=\"{index_page_name(other * page_size)}\" title=\"{ranges[other]}\">{other+1}</a>" for other in range(len(page_steps))]
+                pages = html_templates['index_pages'].substitute(links=" ".join(links))
+            page_path = os.path.join(self.extract_dir, index_page_name(page * page_size))
+            page_futures.append(page_writer.submit(write_page, page_path, 'index',
+                                                   dict(index_page, steps=steps, pages=pages, page=page, page_size=index_page_size)))
+        for name in os.listdir(self.extract_dir):
+            if re.fullmatch(r"index_(\d+)\.htm", name) and int(name[6:-4]) > len(page_steps):
+                os.remove(os.path.join(self.extract_dir, name))
+        with timed("html pages"):
+            for future in page_futures:
+                future.result()
+        page_writer.shutdown()
+        return True
+
+
+# Class sending one email per step (with photos resized in worker processes, videos and step map) and one email for the trip,
+# asking what to do for each step in interactive mode
+class EmailSink(Sink):
+    main_thread = True
+
+    def __init__(self, trip, extract_dir, manifest, maps, media_index, videos=None):
+        super().__init__(trip, extract_dir, manifest)
+        self.maps = maps
+        self.media_index = media_index
+        self.videos = videos
+
+    # return the text of the email of the step
+    def step_content(self, step):
+        mess = f"{step.country} {step.location_name} \U0001F538 {step.weather}"
+        if step.temperature is not None:
+            mess += f"{int(step.temperature)}°C"
+        mess += f"\n\n{step.journal}\n"
+        return mess
+
+    # return the attachments of the step split in emails of at most mail_size Mb, as lists of (filename, content type, data or path, size),
+    # taking resized photos from the results of the worker processes (photos are compressed further if the email is too large)
+    # only resized photos are kept in memory, other files are read by chunks when their email is written
+    def step_parts(self, step, photo_results):
+        photos = []
+        for photo, media in enumerate(step.photos):
+            # get size and resized image (if needed) from the worker processes, in step order
+            with timed("photos"):
+                initial_size, resized_data, new_size, worker_time = next(photo_results)
+            add_time("photo processing (workers)", worker_time)
+            if resized_data is not None:  # resized images are always encoded as JPEG
+                add_count("photos resized")
+                add_count("bytes resized", initial_size)
+                media.resized_size = new_size
+                photos.append([f"img_{step.id}_{photo+1}", "image/jpeg", resized_data, new_size])
+            else:
+                ctype, encoding = mimetypes.guess_type(media.path)
+                if ctype is None or encoding is not None:
+                    ctype = 'image/jpeg'
+                photos.append([f"img_{step.id}_{photo+1}", ctype, media.path, new_size])
+        videos = []
+        for video, media in enumerate(step.videos):
+            video_path = None
+            if self.videos is not None:
+                with timed("videos"):
+                    video_path = self.videos.wait(media)
+            if video_path is not None:  # smaller transcoded version sent instead of the original video
+                videos.append([f"vid_{step.id}_{video+1}", "video/mp4", video_path, media.resized_size])
+                continue
+            ctype, encoding = mimetypes.guess_type(media.path)
+            if ctype is None or encoding is not None:
+                ctype = 'video/mp4'
+            videos.append([f"vid_{step.id}_{video+1}", ctype, media.path, media.size])
+        # attach map of the step
+        maps = []
+        if self.maps is not None:
+            map_path = self.maps.wait(f"map_{step.id}.png")
+            if map_path is not None:
+                maps.append([f"map_{step.id}.png", "image/png", map_path, os.path.getsize(map_path)])
+        limit = mail_size*1024*1024
+        text_size = encoded_size(len(self.step_content(step).encode("utf-8"))) + 4096  # text and headers of the email
+        budget = limit - text_size - attachments_size(maps)
+        if mail_size > 0 and Image is not None and attachments_size(photos) + attachments_size(videos) > budget:
+            # compress photos to be sent with the videos, unless videos leave them less than half of the email (videos are then sent in next emails)
+            available = budget - attachments_size(videos) if budget - attachments_size(videos) >= budget // 2 else budget
+            ratio = available / attachments_size(photos)
+            if ratio < 1:
+                with timed("photos"), concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = executor.map(fit_photo, [media.path for media in step.photos], [int(photo[3] * ratio) - 1024 for photo in photos],
+                                           itertools.repeat(photo_height), itertools.repeat(photo_quality))
+                    for photo, media, (data, worker_time) in zip(photos, step.photos, results):
+                        add_time("photo compression (workers)", worker_time)
+                        add_count("photos compressed")
+                        if len(data) < photo[3]:
+                            photo[1:] = ["image/jpeg", data, len(data)]
+                            media.resized_size = len(data)
+        step.email_size = sum(size for filename, ctype, source, size in photos + videos)
+        # split photos and videos in emails of at most mail_size Mb, in step order (a file larger than that is sent alone),
+        # the map being added to the first email with enough room left
+        parts = [[]]
+        used = [text_size]
+        for attachment in photos + videos:
+            size = attachments_size([attachment])
+            if mail_size > 0 and parts[-1] and used[-1] + size > limit:
+                parts.append([])
+                used.append(4096)
+            if mail_size > 0 and size + 4096 > limit:
+                print(f"! {attachment[0]} ({round(attachment[3]/1024/102.4)/10}Mb) is larger than the email size limit ({mail_size}Mb), sent alone.")
+            parts[-1].append(attachment)
+            used[-1] += size
+        for attachment in maps:
+            part = next((part for part in range(len(parts)) if mail_size == 0 or used[part] + attachments_size([attachment]) <= limit), None)
+            if part is None:
+                parts.append([])
+                used.append(4096)
+            parts[part if part is not None else -1].append(attachment)
+        if len(parts) > 1:
+            print(f"Step {step.name} split in {len(parts)} emails of at most {mail_size}Mb.")
+        return parts
+
+    # return the email with the given part of the attachments of the step, as (message, attachments) tuple
+    # (files are only read by chunks when the email is written to the outbox, so that they are never whole in memory)
+    def step_message(self, step, parts, part):
+        msg = EmailMessage()
+        msg['Subject'] = step.name if len(parts) == 1 else f"{step.name} ({part+1}/{len(parts)})"
+        msg["Date"] = step.time
+        msg.set_content(self.step_content(step) if part == 0 else f"{step.name} ({part+1}/{len(parts)})\n")
+        return msg, parts[part]
+
+    # return the queue sending emails in background, started when the first email is sent
+    def mail_queue(self):
+        if self.outbox is None:
+            self.outbox = MailQueue(os.path.join(self.extract_dir, "outbox"), self.manifest, mail_queue, mail_retries)
+        return self.outbox
+
+    # queue the emails of the step (or of the trip) to be sent in background, waiting for them in interactive mode
+    def send(self, key, messages):
+        with timed("email"):
+            self.mail_queue().submit(key, messages)
+            if interactive:  # result is displayed before next question
+                self.outbox.flush()
+
+    def run(self):
+        self.outbox = None
+        try:
+            return self.send_emails()
+        finally:  # wait for emails still queued
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def send_emails(self):
+        global media_cache
+        trip = self.trip
+        if interactive:
+            print(trip_text(trip))
+        # send again emails left in the outbox by previous runs (their steps are not generated again, unless forced)
+        resumed = set()
+        outbox_dir = os.path.join(self.extract_dir, "outbox")
+        if os.path.isdir(outbox_dir) and any(name.endswith(".eml") for name in os.listdir(outbox_dir)):
+            pending = self.mail_queue().pending()
+            if not force:
+                print(f"{sum(len(paths) for paths in pending.values())} email(s) not sent by a previous run found in outbox, sent again.")
+            for key, paths in pending.items():
+                if force:
+                    for path in paths:
+                        os.remove(path)
+                else:
+                    self.outbox.resume(key, paths)
+                    resumed.add(key)
+        # start processing photos in worker processes
+        # (photos are only resized when pillow is available, and only decoded when the index tells they are too tall or does not know their height)
+        photo_jobs = ((media.path, Image is not None and (media.height is None or media.height > photo_height))
+                      for step in trip.steps for media in map(self.media_index.probe, step.photos))
+        if cache_size > 0 and Image is not None:
+            media_cache = MediaCache(os.path.join(self.extract_dir, "cache"), cache_size*1024*1024)
+        photo_results = process_photos(photo_jobs, workers, photo_height, photo_quality, media_cache)
+        try:
+            for step in trip.steps:
+                parts = self.step_parts(step, photo_results)
+                self.step_done(step)
+                if str(step.id) in resumed:
+                    continue
+                # if interactive mode is active, it will ask what to do for each step
+                # steps already emailed during previous runs are not sent again (unless forced)
+                emailed = self.manifest.get(('steps', step.id, 'emailed'), False)
+                already_emailed = emailed and not force
+                if interactive:
+                    print(step_text(step))
+                    emailed_text = " (already emailed)" if emailed else ""
+                    action = input(f"--> Action for step {step.number+1} [{step.name}]{emailed_text} ? (s)kip (default), (e)mail, (q)uit ? ")
+                    if action == "q" or action == "quit":
+                        print("...exiting")
+                        return False
+                    elif action == "e" or action == "email":
+                        print("...mailing this step")
+                        self.send(str(step.id), (self.step_message(step, parts, part) for part in range(len(parts))))
+                    elif action == "s" or action == "skip" or action == "":
+                        print("...jumping to next step")
+                    else:
+                        print("...resuming")
+                        if mail and not already_emailed:
+                            self.send(str(step.id), (self.step_message(step, parts, part) for part in range(len(parts))))
+                    self.manifest.save()
+                elif already_emailed:
+                    print(f"Step {step.name} already emailed, not sent again.")
+                else:
+                    self.send(str(step.id), (self.step_message(step, parts, part) for part in range(len(parts))))
+                    self.manifest.save()
+        finally:  # stop photos processing
+            photo_results.close()
+        # generate global trip email
+        if "trip" in resumed:
+            return True
+        if interactive:
+            action = input("-->Generate global trip email ? (y)es, (n)o ? ")
+            if action == "n" or action == "no":
+                return True
+        msg = EmailMessage()
+        msg['Subject'] = trip.name
+        msg["Date"] = trip.start_time
+        country = trip.steps[-1].country if trip.steps else ""
+        mess = f"{trip.summary}\n{country} {round(trip.distance)}km, {trip.step_count} steps, {trip.start_date}-{trip.end_date}\n"
+        msg.set_content(mess)
+        map_path = self.maps.wait("steps_map.png") if self.maps is not None else None
+        maps = [("steps_map.png", "image/png", map_path, os.path.getsize(map_path))] if map_path is not None else []
+        if self.manifest.get(('trip_emailed',), False) and not force and not interactive:
+            print(f"Trip {trip.name} already emailed, not sent again.")
+        else:
+            self.send("trip", [(msg, maps)])
+            self.manifest.save()
+        return True
+
+
+# Function to parse data and generate different items depending on options selected
+def parse_data(data, original_path, extract_dir, track=None):
+    # build the model of the trip once, used by all outputs
+    media_index = MediaIndex(os.path.join(extract_dir, "media_index.json"), original_path)
+    trip = Trip(data, original_path)
+    # load manifest of previous runs (fingerprints of step pages and maps written, steps already emailed)
+    manifest = Manifest(os.path.join(extract_dir, "manifest.json"), [step.id for step in trip.steps])
+    summary = {'name': trip.name, 'summary': trip.summary, 'start': trip.start_date, 'end': trip.end_date, 'steps': trip.step_count,
+               'photos': sum(len(step.photos) for step in trip.steps), 'videos': sum(len(step.videos) for step in trip.steps),
+               'size': sum(media.size for step in trip.steps for media in step.photos + step.videos),
+               'text_file': f"{trip.name}_{trip.start_date}.txt"}
+    for counter in ('steps', 'photos', 'videos'):
+        add_count(counter, summary[counter])
+    add_count("media bytes", summary['size'])
+    # compute distance, moving time and stops of each step from locations
+    if track is not None and len(track) > 1 and trip.steps:
+        if numpy is None:
+            print("! numpy not found, route of steps is not analyzed.")
+        else:
+            with timed("route analytics"):
+                routes, trip.tracked_distance = track.analyze([step.start_time for step in trip.steps], stop_radius, stop_duration * 60)
+            for step, route in zip(trip.steps, routes):
+                step.route = route
+
+    # start rendering static maps in worker processes (also used to generate thumbnails of html pages)
+    executor = None
+    if transcode and not ffmpeg_path:
+        print("! ffmpeg not found, videos are not transcoded.")
+    if (gen_map and (local or mail or interactive)) or (local and Image is not None) or (transcode and ffmpeg_path):
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    maps = None
+    if gen_map and (local or mail or interactive):
+        maps = MapRenderer(executor, extract_dir, manifest)
+        for step in trip.steps:
+            maps.submit(f"map_{step.id}.png", "osm", 300, 200, markers=[(step.lat, step.lon)], zoom=7)
+        # maps presenting the whole trip, without first and last steps if requested
+        map_steps = trip.steps[1:-1] if exclude and len(trip.steps) > 2 else trip.steps
+        maps.submit("steps_map.png", "arcgis-worldimagery", 800, 600, markers=[(step.lat, step.lon) for step in map_steps])
+        if track is not None and len(track) > 0:
+            map_track = track.window(map_steps[0].start_time, map_steps[-1].start_time) if map_steps is not trip.steps else track
+            levels = map_track.simplify(50, 500) if len(map_track) > 0 else []
+            if levels:
+                route = [(map_track.lat[i], map_track.lon[i]) for i in levels[0][1]]
+                maps.submit("trip_map.png", "arcgis-worldimagery", 800, 600, lines=[route])
+    # start transcoding videos in worker processes (after maps, which are needed first)
+    videos = None
+    if transcode and ffmpeg_path:
+        videos = VideoTranscoder(executor, extract_dir, original_path)
+        for step in trip.steps:
+            for media in step.videos:
+                videos.submit(media)
+
+    # generate enabled outputs: sinks run concurrently in threads, except in interactive mode where they run one after the other
+    sinks = []
+    if mail or interactive:
+        sinks.append(EmailSink(trip, extract_dir, manifest, maps, media_index, videos))
+    sinks.append(TextSink(trip, extract_dir, manifest, videos))
+    if local:
+        sinks.append(HtmlSink(trip, extract_dir, manifest, executor, track, videos))
+    if json_output:
+        sinks.append(JsonSink(trip, extract_dir, manifest))
+    if database:
+        sinks.append(DatabaseSink(trip, extract_dir, manifest, track, database))
+    if any(sink.sorted_media for sink in sinks):
+        trip.sort_media(media_index)
+    Sink.progress = Progress(len(trip.steps) * len(sinks)) if profile and trip.steps else None
+    completed = True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(sinks)) as sink_pool:
+        futures = [sink_pool.submit(sink.run) for sink in sinks if not (sink.main_thread or interactive)]
+        for sink in sinks:
+            if (sink.main_thread or interactive) and completed:
+                completed = sink.run()
+        for future in futures:
+            future.result()
+    # wait for maps not used by outputs (or cancel them after interactive quit) and save manifest
+    if maps is not None:
+        if completed:
+            maps.finish()
+        else:
+            maps.cancel()
+    if videos is not None and not completed:
+        videos.cancel()
+    if executor is not None:
+        executor.shutdown()
+    manifest.save()
+    media_index.save()
+    return summary if completed else None
+
+
+# Class storing locations of the trip as columns of floats (much smaller than one python object per location)
+class Track:
+    __slots__ = ('lat', 'lon', 'time')
+
+    def __init__(self):
+        self.lat = array('d')
+        self.lon = array('d')
+        self.time = array('d')
+
+    def __len__(self):
+        return len(self.time)
+
+    # add one location read from locations.json
+    def append(self, point):
+        self.lat.append(point['lat'])
+        self.lon.append(point['lon'])
+        self.time.append(point['time'])
+
+    # return a new track with locations between start and end times (track sorted by time)
+    def window(self, start, end):
+        first = bisect.bisect_left(self.time, start)
+        last = bisect.bisect_right(self.time, end)
+        track = Track()
+        track.lat, track.lon, track.time = self.lat[first:last], self.lon[first:last], self.time[first:last]
+        return track
+
+    # sort locations by time (stable sort, locations with same time keep their order in file)
+    def sort(self):
+        if numpy is not None:
+            order = numpy.argsort(numpy.frombuffer(self.time, dtype=numpy.float64), kind='stable')
+            for column in self.__slots__:
+                sorted_column = array('d')
+                sorted_column.frombytes(numpy.frombuffer(getattr(self, column), dtype=numpy.float64)[order].tobytes())
+                setattr(self, column, sorted_column)
+        else:
+            order = sorted(range(len(self.time)), key=self.time.__getitem__)
+            for column in self.__slots__:
+                values = getattr(self, column)
+                setattr(self, column, array('d', (values[i] for i in order)))
+
+    # return locations (all or only those which indexes are given) encoded as polyline
+    def encoded(self, indexes=None):
+        if indexes is None:
+            return encode_polyline(self.lat, self.lon)
+        if numpy is not None:
+            return encode_polyline(numpy.frombuffer(self.lat, dtype=numpy.float64)[indexes].tolist(),
+                                   numpy.frombuffer(self.lon, dtype=numpy.float64)[indexes].tolist())
+        return encode_polyline([self.lat[i] for i in indexes], [self.lon[i] for i in indexes])
+
+    # return the importance of each location for the route shape (Douglas-Peucker simplification down to tolerance in meters):
+    # keeping locations which importance is above a value gives the route simplified with this value as tolerance
+    def importance(self, tolerance):
+        n = len(self.time)
+        # project locations on a plane (in meters, equirectangular projection)
+        if numpy is not None:
+            lat = numpy.radians(numpy.frombuffer(self.lat, dtype=numpy.float64))
+            x = 6371000 * numpy.radians(numpy.frombuffer(self.lon, dtype=numpy.float64)) * numpy.cos(lat)
+            y = 6371000 * lat
+            importance = numpy.zeros(n)
+        else:
+            y = [6371000 * math.radians(lat) for lat in self.lat]
+            x = [6371000 * math.radians(lon) * math.cos(math.radians(lat)) for lat, lon in zip(self.lat, self.lon)]
+            importance = [0.0] * n
+        if n == 0:
+            return importance
+        importance[0] = importance[n-1] = math.inf
+        if numpy is not None:  # all segments of a level of the recursion are split at once, with one numpy pass on their locations
+            firsts, lasts, parents = numpy.array([0]), numpy.array([n-1]), numpy.array([math.inf])
+            while len(firsts) > 0:
+                longer = lasts - firsts >= 2
+                firsts, lasts, parents = firsts[longer], lasts[longer], parents[longer]
+                if len(firsts) == 0:
+                    break
+                indexes, distances = farthest_locations(x, y, firsts, lasts)
+                split = distances > tolerance  # other segments have all their locations removed
+                firsts, lasts, parents, indexes = firsts[split], lasts[split], parents[split], indexes[split]
+                importance[indexes] = numpy.minimum(distances[split], parents)
+                firsts, lasts = numpy.concatenate((firsts, indexes)), numpy.concatenate((indexes, lasts))
+                parents = numpy.concatenate((importance[indexes], importance[indexes]))
+            return importance
+        segments = [(0, n-1, math.inf)]  # (first, last, importance of the location which split the segment)
+        while segments:
+            first, last, parent = segments.pop()
+            if last - first < 2:
+                continue
+            index, distance = farthest_location(x, y, first, last)
+            if distance <= tolerance:  # all locations of segment can be removed
+                continue
+            # a location is never more important than the one which split its segment (keeps simplifications consistent)
+            importance[index] = min(distance, parent)
+            segments.append((first, index, importance[index]))
+            segments.append((index, last, importance[index]))
+        return importance
+
+    # return route statistics of each step (distance in km, moving time and number and duration of stops, in seconds) computed from
+    # the segments between consecutive locations, from the start time of the step to the start time of the next one, and the total
+    # distance of the track (computed with numpy on whole columns, without loop on locations)
+    def analyze(self, step_times, stop_radius=200, stop_duration=15*60):
+        lat = numpy.radians(numpy.frombuffer(self.lat, dtype=numpy.float64))
+        lon = numpy.radians(numpy.frombuffer(self.lon, dtype=numpy.float64))
+        times = numpy.frombuffer(self.time, dtype=numpy.float64)
+        # haversine distance (in km), duration and speed (in km/h) of each segment
+        cos_lat = numpy.cos(lat)
+        a = numpy.square(numpy.sin(numpy.diff(lat) / 2)) + cos_lat[:-1] * cos_lat[1:] * numpy.square(numpy.sin(numpy.diff(lon) / 2))
+        distance = 2 * 6371 * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1)))
+        duration = numpy.diff(times)
+        speed = numpy.divide(distance * 3600, duration, out=numpy.zeros_like(distance), where=duration > 0)
+        # stops are runs of consecutive segments shorter than stop_radius and slower than 2km/h, lasting at least stop_duration
+        still = (distance * 1000 < stop_radius) & (speed < 2)
+        edges = numpy.diff(still.astype(numpy.int8), prepend=0, append=0)
+        starts, ends = numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)  # first and after last segment of each run
+        elapsed = numpy.concatenate(([0], numpy.cumsum(duration)))
+        stop_times = elapsed[ends] - elapsed[starts]
+        long_stops = stop_times >= stop_duration
+        starts, ends, stop_times = starts[long_stops], ends[long_stops], stop_times[long_stops]
+        stopped = numpy.zeros(len(distance) + 1, dtype=numpy.int8)
+        stopped[starts] = 1
+        stopped[ends] = -1
+        stopped = numpy.cumsum(stopped[:-1], dtype=numpy.int8) > 0
+        # segments lasting more than one hour without stop are gaps of tracking, not counted in moving time
+        moving = numpy.where(stopped | (duration > 3600), 0, duration)
+        # assign segments (by their start time) and stops (by the time they began) to the step of their time window: as locations
+        # and windows are sorted by time, sums of each window are differences of cumulative sums at window boundaries
+        order = numpy.argsort(numpy.asarray(step_times, dtype=numpy.float64), kind='stable')
+        window_starts = numpy.asarray(step_times, dtype=numpy.float64)[order]
+        bounds = numpy.append(numpy.searchsorted(times[:-1], window_starts), len(distance))  # segments before the first step are not counted
+        stop_windows = numpy.searchsorted(window_starts, times[starts], side='right') - 1
+        stop_windows, stop_times = stop_windows[stop_windows >= 0], stop_times[stop_windows >= 0]
+        columns = [numpy.diff(numpy.concatenate(([0], numpy.cumsum(distance)))[bounds]), numpy.diff(numpy.concatenate(([0], numpy.cumsum(moving)))[bounds]),
+                   numpy.bincount(stop_windows, minlength=len(step_times)), numpy.bincount(stop_windows, weights=stop_times, minlength=len(step_times))]
+        routes = [None] * len(step_times)
+        for window, step in enumerate(order):
+            routes[step] = {'distance': round(float(columns[0][window]), 1), 'moving': int(columns[1][window]),
+                            'stops': int(columns[2][window]), 'stopped': int(columns[3][window])}
+        return routes, round(float(distance.sum()), 1)
+
+    # return levels of detail of the route as (tolerance in meters, JSON list of locations), from the most to the least detailed
+    def simplify(self, tolerance, max_points=0):
+        importance = self.importance(tolerance)
+        if numpy is not None:  # most important locations first
+            kept = numpy.argsort(-importance, kind='stable')
+            kept = kept[importance[kept] > 0]
+        else:
+            kept = sorted(range(len(importance)), key=importance.__getitem__, reverse=True)
+            kept = [i for i in kept if importance[i] > 0]
+        level_tolerance = tolerance
+        if max_points > 0 and len(kept) > max(2, max_points):
+            kept = kept[:max(2, max_points)]
+            level_tolerance = max(tolerance, float(importance[kept[-1]]))  # tolerance giving the same number of locations
+        levels = []
+        while len(kept) > 0:
+            level = numpy.sort(kept) if numpy is not None else sorted(kept)
+            if not levels or len(level) < len(levels[-1][1]) / 2:  # only keep levels reducing points significantly
+                levels.append((level_tolerance, level))
+            if len(level) <= 500:  # small enough to be displayed quickly at any zoom
+                break
+            level_tolerance *= 4
+            if numpy is not None:
+                kept = kept[importance[kept] > level_tolerance]
+            else:
+                kept = [i for i in kept if importance[i] > level_tolerance]
+        return levels
+
+
+# Function to return normalized words of the text in parameter (lowercase, without accents), as searched by the search box of index.htm
+# (same normalization as searchWords in search_js: all marks are removed, as /\p{M}/ does)
+def search_words(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(char for char in text if not unicodedata.category(char).startswith("M")).lower()
+    return re.findall(r"[^\W_]+", text)
+
+
+# Function to write the search index of steps (words of their name, description, place and date) in the directory in parameter,
+# sharded by the 2 first letters of words so that the search box only loads the shards of the words searched
+def write_search_index(directory, steps):
+    shards = collections.defaultdict(dict)
+    for step in steps:
+        fields = [step.name, step.journal, step.location_name, step.location_country, step.location_detail, step.date, step.time.strftime('%B')]
+        for word in set(search_words(" ".join(field for field in fields if field))):
+            if len(word) >= 2:
+                shards[word[:2].encode("utf-8").hex()].setdefault(word, []).append(step.number)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    written = set()
+    for key, words in shards.items():
+        for word, numbers in words.items():  # step numbers are delta encoded
+            words[word] = [number - previous for number, previous in zip(numbers, [0] + numbers[:-1])]
+        content = f"searchShard(\"{key}\", {json.dumps(dict(sorted(words.items())), ensure_ascii=False, separators=(',', ':'))});\n"
+        path = os.path.join(directory, f"{key}.js")
+        if not os.path.exists(path) or Path(path).read_text(encoding="utf-8") != content:
+            write_file(path, content)
+            add_count("search shards written")
+        written.add(f"{key}.js")
+    for name in os.listdir(directory):  # remove shards of words which are not used anymore
+        if name.endswith(".js") and name not in written:
+            os.remove(os.path.join(directory, name))
+    return len(shards)
+
+
+# Function to encode coordinates in parameter as polyline (Google encoded polyline format, 6 decimals: less than 1 character per digit)
+def encode_polyline(lats, lons, precision=6):
+    factor = 10 ** precision
+    chars = []
+    prev_lat = prev_lon = 0
+    for lat, lon in zip(lats, lons):
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chars.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chars.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return "".join(chars)
+
+
+# Function to write trip_data.js file shared by all html pages, with steps and route of the trip (read once and cached by the browser)
+def write_trip_data(path, steps, track, route_levels):
+    trip_data = {
+        'steps': [{'id': step.id, 'name': step.name, 'date': step.date} for step in steps],
+        'stepsLine': encode_polyline([step.lat for step in steps], [step.lon for step in steps]),
+        'route': [[level_tolerance, track.encoded(level)] for level_tolerance, level in route_levels]
+    }
+    write_file(path, f"var tripData = {json.dumps(trip_data, ensure_ascii=False)};\n{trip_data_js}")
+
+
+# Function to return the location farthest from the segment between first and last locations, and its distance
+def farthest_location(x, y, first, last):
+    x0, y0, x1, y1 = x[first], y[first], x[last], y[last]
+    dx, dy = x1 - x0, y1 - y0
+    length = dx * dx + dy * dy
+    best_index, best_distance = first, -1.0
+    for i in range(first+1, last):
+        px, py = x[i] - x0, y[i] - y0
+        t = min(1, max(0, (px * dx + py * dy) / length)) if length > 0 else 0
+        distance = math.hypot(px - t * dx, py - t * dy)
+        if distance > best_distance:
+            best_index, best_distance = i, distance
+    return best_index, best_distance
+
+
+# Function to return the locations farthest from the segments between first and last locations in parameter, and their distances
+# (numpy arrays of segments with at least one location between first and last, all computed at once)
+def farthest_locations(x, y, firsts, lasts):
+    counts = lasts - firsts - 1
+    segments = numpy.repeat(numpy.arange(len(firsts)), counts)  # segment of each location
+    starts = numpy.cumsum(counts) - counts  # position of the first location of each segment
+    indexes = numpy.arange(len(segments)) - starts[segments] + firsts[segments] + 1
+    x0, y0 = x[firsts][segments], y[firsts][segments]
+    dx, dy = (x[lasts] - x[firsts])[segments], (y[lasts] - y[firsts])[segments]
+    length = dx * dx + dy * dy
+    px, py = x[indexes] - x0, y[indexes] - y0
+    t = numpy.clip(numpy.divide(px * dx + py * dy, length, out=numpy.zeros_like(length), where=length > 0), 0, 1)
+    distances = numpy.hypot(px - t * dx, py - t * dy)
+    maxima = numpy.maximum.reduceat(distances, starts)
+    candidates = numpy.flatnonzero(distances == maxima[segments])  # sorted by segment
+    first_candidates = numpy.flatnonzero(numpy.diff(segments[candidates], prepend=-1))  # first farthest location of each segment
+    return indexes[candidates[first_candidates]], maxima
+
+
+# Function to iterate on locations of locations.json file opened in parameter, reading it by chunks (when ijson is not available)
+def iter_locations(f_in, chunk_size=1024*1024):
+    decoder = json.JSONDecoder()
+    # find beginning of locations list
+    buffer = ""
+    while True:
+        more = f_in.read(chunk_size)
+        buffer = buffer + more
+        start = re.search(r'"locations"\s*:\s*\[', buffer)
+        if start is not None:
+            break
+        if not more:
+            return
+        buffer = buffer[-64:]  # keep end of buffer in case the key is split between chunks
+    buffer = buffer[start.end():]
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            point, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:  # location split between chunks, read next chunk
+            more = f_in.read(chunk_size)
+            if not more:
+                raise
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield point
+
+
+# Function to read locations.json file in parameter without loading it whole in memory, returning locations sorted by time
+def load_track(path):
+    track = Track()
+    if ijson is not None:
+        with storage(path).open(path) as f_in:
+            for point in ijson.items(f_in, 'locations.item', use_float=True):
+                track.append(point)
+    else:
+        with storage(path).open(path) as f_in, io.TextIOWrapper(f_in, encoding="utf-8") as f_text:
+            for point in iter_locations(f_text):
+                track.append(point)
+    track.sort()
+    return track
+
+
+# Function to print time spent in each stage of the run (and counters with the profile option)
+def print_timings(total_time):
+    stages = ", ".join(f"{stage} {round(duration, 2)}s" for stage, duration in stage_times.items())
+    print(f"Timings: {stages} (total {round(total_time, 2)}s)")
+    if profile:
+        print(f"Counters: {', '.join(f'{counter} {value}' for counter, value in stage_counts.items())}")
+
+
+# Function to write the profile report of the run (time spent in each stage, counters and throughput) in the directory in parameter
+def write_profile(directory, total_time):
+    report = {'date': datetime.datetime.now().isoformat(timespec="seconds"), 'arguments': sys.argv[1:], 'workers': workers,
+              'total_seconds': round(total_time, 3), 'stages_seconds': {stage: round(duration, 3) for stage, duration in stage_times.items()},
+              'counters': dict(stage_counts),
+              'throughput': {'steps_per_second': round(stage_counts['steps'] / total_time, 2), 'photos_per_second': round(stage_counts['photos'] / total_time, 2),
+                             'media_mb_per_second': round(stage_counts['media bytes'] / 1024 / 1024 / total_time, 2)}}
+    save_json(os.path.join(directory, "profile.json"), report)
+    print(f"Profile report written in {os.path.join(directory, 'profile.json')}.")
+
+
+# Function to extract data of the trip stored in the directory in parameter, returning its summary
+def extract_trip(trip_path):
+    global no_location
+    # create extraction directory to store all generated files
+    trip_extract_dir = os.path.join(output_path(trip_path), extract_dir)
+    store = storage(trip_path)
+    try:
+        Path(trip_extract_dir).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        print(f"! Could not create directory ({trip_extract_dir}) to host files.")
+        return None
+    # analyze locations file to get route data
+    track = None
+    no_location = True
+    if store.exists(os.path.join(trip_path, map_file)):
+        print(f"Extracting trip track from {map_file} file...")
+        with timed("json loading"):
+            track = load_track(os.path.join(trip_path, map_file))
+        print(f"{len(track)} locations read.")
+        no_location = False
+    else:
+        print(f"! Locations file ({map_file}) not found.")
+    # analyze trip file (with the most important information to extract)
+    print(f"Extracting steps from {trip_file} file...")
+    with store.open(os.path.join(trip_path, trip_file)) as f_in:
+        with timed("json loading"):
+            data = json.load(f_in)
+    return parse_data(data, trip_path, trip_extract_dir, track)
+
+
+# Function to find all trip directories (containing trip.json) in the Polarsteps export directory in parameter
+def find_trips(export_path):
+    trip_paths = []
+    store = storage(export_path)
+    if store is not dir_storage:  # trips of a zip file are found in its central directory, without decompressing it
+        return sorted(os.path.join(export_path, *name.split("/")[:-1]) for name in store.archive.namelist()
+                      if name.rsplit("/", 1)[-1] == trip_file)
+    for path, dirs, files in os.walk(export_path):
+        if trip_file in files:
+            trip_paths.append(path)
+            dirs.clear()  # steps directories of a trip do not contain other trips
+        else:
+            dirs.sort()
+    return sorted(trip_paths)
+
+
+# Function to extract one trip of a batch in a worker process, with options of the main process (output written in Extracts/extract.log)
+def extract_batch_trip(trip_path, options):
+    global mail_sender
+    globals().update(options)
+    mail_sender = None
+    stage_times.clear()
+    stage_counts.clear()
+    start = time.perf_counter()
+    result = {'path': trip_path, 'summary': None, 'error': None}
+    trip_extract_dir = os.path.join(output_path(trip_path), extract_dir)
+    Path(trip_extract_dir).mkdir(parents=True, exist_ok=True)
+    with open(os.path.join(trip_extract_dir, "extract.log"), 'w', encoding="utf-8") as log:
+        with contextlib.redirect_stdout(log):
+            profiler = cProfile.Profile() if profile_stats else None
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result['summary'] = extract_trip(trip_path)
+                if result['summary'] is None:
+                    result['error'] = "extraction failed (see extract.log)"
+            except Exception as e:  # a failing trip should not stop the others
+                traceback.print_exc(file=log)
+                result['error'] = f"{type(e).__name__}: {e}"
+            if profiler is not None:  # statistics of the main thread of the process of the trip
+                profiler.disable()
+                profiler.dump_stats(os.path.join(trip_extract_dir, "profile.pstats"))
+                print(f"Profile statistics written in {os.path.join(trip_extract_dir, 'profile.pstats')} (python -m pstats {os.path.join(trip_extract_dir, 'profile.pstats')}).")
+            if mail_sender is not None:
+                mail_sender.close()
+            result['duration'] = time.perf_counter() - start
+            print_timings(result['duration'])
+            if profile:
+                write_profile(trip_extract_dir, result['duration'])
+    result['timings'] = dict(stage_times)
+    result['counters'] = dict(stage_counts)
+    return result
+
+
+# Function to extract all trips of the Polarsteps export directory in parameter with several processes, then write an index linking them
+def extract_batch(export_path):
+    start = time.perf_counter()
+    trip_paths = find_trips(export_path)
+    if not trip_paths:
+        print(f"! No trip found in {export_path} (no {trip_file} file).")
+        return
+    print(f"{len(trip_paths)} trip(s) found, extracted by {workers} process(es)...")
+    if mail:  # ask email parameters and check connection once, before starting worker processes
+        ask_mail_params()
+        sender = MailSender(mail_serv, mail_port)
+        try:
+            sender.connect()
+        except (smtplib.SMTPException, OSError) as e:  # server not reachable or login refused: no trip is extracted
+            print(f"! Could not connect to email server {mail_serv}:{mail_port} ({e}).")
+            return
+        sender.close()
+    options = {name: globals()[name] for name in ("mail", "local", "json_output", "verbose", "exclude", "force", "photo_height", "photo_quality", "transcode", "video_height", "video_quality", "mail_size", "mail_retries", "mail_queue", "cache_size", "profile", "profile_stats", "route_tolerance", "route_points", "map_tiles", "tiles_cache", "database", "index_page_size",
+                                                  "dest_email", "orig_email", "mail_serv", "mail_port", "mail_login", "mail_passwd")}
+    options['workers'] = 1  # photos of each trip are processed by the process of the trip
+    options['mail_rate'] = max(1, mail_rate // workers) if mail_rate > 0 else 0  # share email rate between trips
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract_batch_trip, trip_path, options): trip_path for trip_path in trip_paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:  # worker process crashed
+                result = {'path': futures[future], 'summary': None, 'error': f"{type(e).__name__}: {e}", 'duration': 0, 'timings': {}, 'counters': {}}
+            trip_dir = os.path.relpath(result['path'], export_path)
+            if result['error'] is None:
+                summary = result['summary']
+                print(f"{trip_dir}: {summary['name']}, {summary['steps']} steps, {summary['photos']} photo(s), {summary['videos']} video(s) in {round(result['duration'], 2)}s")
             else:
-                print("! No route data to display.")
-            index_file.write("</script>\n")
-            index_file.write("</p>\n</body>\n")
-            index_file.close()
-        if mail or interactive:  # generate global trip email
-            if interactive:
-                action = input("-->Generate global trip email ? (y)es, (n)o ? ")
-                if action == "n" or action == "no":
-                    return
-            msg = EmailMessage()
-            msg['Subject'] = trip_name
-            to_zone = tz.gettz(timezone_id)
-            creation_time = datetime.datetime.fromtimestamp(data['start_date'])
-            creation_time = creation_time.replace(tzinfo=from_zone)  # mark the TZ as UTC
-            msg["Date"] = creation_time.astimezone(to_zone)
-            mess = f"{trip_summary}\n{country} {round(total_distance)}km, {total_entries} steps, {trip_start_date}-{trip_end_date}\n"
-            msg.set_content(mess)
-            email(msg)
+                print(f"! {trip_dir}: {result['error']}")
+            results.append(result)
+    results.sort(key=lambda result: result['path'])
+    write_batch_index(export_path, results)
+    # print aggregate report
+    total_time = time.perf_counter() - start
+    done = [result for result in results if result['error'] is None]
+    steps = sum(result['summary']['steps'] for result in done)
+    photos = sum(result['summary']['photos'] for result in done)
+    size = sum(result['summary']['size'] for result in done)
+    for result in results:
+        for stage, duration in result['timings'].items():
+            add_time(stage, duration)
+        for counter, value in result['counters'].items():
+            add_count(counter, value)
+    print(f"=== {len(done)} trip(s) extracted, {len(results)-len(done)} failed: {steps} steps, {photos} photos, {round(size/1024/102.4)/10}Mb in {round(total_time, 2)}s "
+          f"({round(steps/total_time, 1)} steps/s, {round(photos/total_time, 1)} photos/s, {round(size/1024/1024/total_time, 1)}Mb/s) ===")
+    print_timings(sum(result['duration'] for result in results))
+
+
+# Function to write index.htm file in export directory, linking extracted trips
+def write_batch_index(export_path, results):
+    Path(output_path(export_path)).mkdir(parents=True, exist_ok=True)
+    write_file(os.path.join(output_path(export_path), "local.css"), css_text)
+    trips = []
+    for result in results:
+        trip_dir = os.path.relpath(output_path(result['path']), output_path(export_path)).replace(os.sep, "/")
+        summary = result['summary']
+        if result['error'] is not None:
+            trips.append({'template': 'trip_error', 'dir': html.escape(trip_dir), 'error': html.escape(result['error'])})
+            continue
+        if local:
+            link = f"{trip_dir}/{extract_dir}/index.htm"
+        else:
+            link = f"{trip_dir}/{extract_dir}/{summary['text_file']}"
+        # trip names, summaries and folder names are written by the user, so they are escaped like error messages
+        trips.append(dict({key: html.escape(str(value)) for key, value in summary.items()}, template='trip', link=html.escape(link)))
+    write_page(os.path.join(output_path(export_path), "index.htm"), 'trips', {'count': len(results), 'trips': trips})
 
 
 # Function to print instructions of the script
@@ -657,71 +2971,213 @@ Here are the additional options that could be combined and put at launch:
 -v, -verbose :                  to add additional information in the generated text file
 -l, -local :                    to generate local html files to navigate the steps
 -e, -email address@domain.com : to send emails containing description, images and videos from extracted steps to the given address (for example to fill a blog like blogger or wordpress using postie plugin); consider putting your common email server parameters directly in the script to avoid having to type them every time you execute the script
+-r, -rate N :                   to send at most N emails per minute (to stay under the limits of your email provider)
+-m, -mailsize N :               to send emails of at most N Mb (default 20, 0 for no limit), photos are compressed and larger steps are sent in several emails
+-j, -jobs N :                   to process photos (or trips in batch mode) with N processes in parallel (default 1)
+--max-height N :                to resize photos sent by email to N pixels high when they are taller (default 800)
+-q, -quality N :                to encode resized photos with JPEG quality N, from 1 to 95 (default 75)
+--cache-stats :                 to display statistics of the cache of resized photos kept between runs in Extracts/cache
+--profile :                     to display progress and write time spent in each stage and counters (steps, photos, bytes read, emails...) in Extracts/profile.json
+--profile-stats :               to also write cProfile statistics of the main thread in Extracts/profile.pstats
 -i, -interactive :              to display an analysis and interactively ask what to do for each step (skip, email, continue or quit)
+-f, -force :                    to regenerate all step pages and send again emails of steps already emailed during previous runs
+-b, -batch export_directory :   to extract all trips found in the given directory of your unzipped Polarsteps data (or directly in the Polarsteps zip file, outputs being written in a directory named like it), N trips in parallel with the -j option
+-s, -simplify N :               to simplify the route displayed in index.htm with a tolerance of N meters (default 5, 0 to keep all tracked locations)
+-p, -points N :                 to display at most N locations of the route in index.htm
+-n, -pagesize N :               to list N steps in each page of index.htm (default 50, 0 to list all steps in one page)
+-t, -tiles directory|none :     to generate maps without network, with map tiles from the given directory ({zoom}/{x}/{y}.png files) or without background (none)
+-c, -convert :                  to transcode videos with ffmpeg to smaller versions (720 pixels high) sent by email and played in html pages
+-o, -json :                     to generate a JSON file describing the trip and its steps (to be used by other programs)
+-d, -database file.db :         to index steps, media and locations in the given SQLite database (updated at each run, and shared by all trips extracted in it) to query them with SQL
 -x, -exclude :                  to exclude the first and last steps from generated maps presenting the whole trip (allow to focus the map when origin country is far away)
+-h, -help :                     to display this help
 anything else will display this help
 """)
 
 
 # Main program
-print(f"=== Extraction of Polarsteps data ===")
-# define json files names used by PS
-trip_file = 'trip.json'
-map_file = 'locations.json'
-# analyze arguments given at launch
-args_nb = len(sys.argv)
-if args_nb > 0:
-    args_index = 1
-    while args_index <= args_nb-1:
-        strParam = sys.argv[args_index]
-        if strParam == "-email" or strParam == "-e":
-            mail = True
-            args_index = args_index + 1
-            if args_index <= args_nb-1:
-                dest_email = sys.argv[args_index]
-                print(f"Email option activated (sending to {dest_email}).")
+if __name__ == "__main__":  # protect main program from being run again by worker processes
+    print(f"=== Extraction of Polarsteps data ===")
+    run_start = time.perf_counter()
+    # analyze arguments given at launch
+    args_nb = len(sys.argv)
+    if args_nb > 0:
+        args_index = 1
+        while args_index <= args_nb-1:
+            strParam = sys.argv[args_index]
+            if strParam == "-email" or strParam == "-e":
+                mail = True
+                args_index = args_index + 1
+                if args_index <= args_nb-1:
+                    dest_email = sys.argv[args_index]
+                    print(f"Email option activated (sending to {dest_email}).")
+                else:
+                    print(f"! Not enough arguments : missing destination email")
+                    printInstructions()
+                    exit()
+            elif strParam == "-rate" or strParam == "-r":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit():
+                    mail_rate = int(sys.argv[args_index])
+                    print(f"Email rate limited to {mail_rate} emails per minute.")
+                else:
+                    print(f"! Missing or invalid number of emails per minute")
+                    printInstructions()
+                    exit()
+            elif strParam == "-mailsize" or strParam == "-m":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit():
+                    mail_size = int(sys.argv[args_index])
+                    print(f"Emails limited to {mail_size}Mb." if mail_size > 0 else "Emails size not limited.")
+                else:
+                    print(f"! Missing or invalid size of emails")
+                    printInstructions()
+                    exit()
+            elif strParam == "-jobs" or strParam == "-j":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit() and int(sys.argv[args_index]) > 0:
+                    workers = int(sys.argv[args_index])
+                    print(f"{workers} processes used in parallel.")
+                else:
+                    print(f"! Missing or invalid number of processes")
+                    printInstructions()
+                    exit()
+            elif strParam == "--max-height" or strParam == "-height":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit() and int(sys.argv[args_index]) > 0:
+                    photo_height = int(sys.argv[args_index])
+                    print(f"Photos taller than {photo_height}px resized for emails.")
+                else:
+                    print(f"! Missing or invalid photo height")
+                    printInstructions()
+                    exit()
+            elif strParam == "-quality" or strParam == "-q":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit() and 1 <= int(sys.argv[args_index]) <= 95:
+                    photo_quality = int(sys.argv[args_index])
+                    print(f"Resized photos encoded with JPEG quality {photo_quality}.")
+                else:
+                    print(f"! Missing or invalid JPEG quality (1 to 95)")
+                    printInstructions()
+                    exit()
+            elif strParam == "--cache-stats" or strParam == "-cache-stats":
+                cache_stats = True
+                print(f"Cache statistics option activated.")
+            elif strParam == "--profile" or strParam == "-profile":
+                profile = True
+                print(f"Profile option activated.")
+            elif strParam == "--profile-stats" or strParam == "-profile-stats":
+                profile = True
+                profile_stats = True
+                print(f"Profile option activated (with cProfile statistics).")
+            elif strParam == "-force" or strParam == "-f":
+                force = True
+                print(f"Force option activated.")
+            elif strParam == "-batch" or strParam == "-b":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and (os.path.isdir(sys.argv[args_index]) or zipfile.is_zipfile(sys.argv[args_index])):
+                    batch_path = os.path.abspath(sys.argv[args_index])
+                    print(f"Batch option activated (extracting all trips found in {batch_path}).")
+                else:
+                    print(f"! Missing or invalid export directory or zip file")
+                    printInstructions()
+                    exit()
+            elif strParam == "-simplify" or strParam == "-s":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit():
+                    route_tolerance = int(sys.argv[args_index])
+                    print(f"Route simplified with a tolerance of {route_tolerance}m.")
+                else:
+                    print(f"! Missing or invalid route tolerance")
+                    printInstructions()
+                    exit()
+            elif strParam == "-points" or strParam == "-p":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit():
+                    route_points = int(sys.argv[args_index])
+                    print(f"Route limited to {route_points} locations.")
+                else:
+                    print(f"! Missing or invalid number of locations")
+                    printInstructions()
+                    exit()
+            elif strParam == "-pagesize" or strParam == "-n":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and sys.argv[args_index].isdigit():
+                    index_page_size = int(sys.argv[args_index])
+                    print(f"Index pages limited to {index_page_size} steps." if index_page_size > 0 else "Index listing all steps in one page.")
+                else:
+                    print(f"! Missing or invalid number of steps")
+                    printInstructions()
+                    exit()
+            elif strParam == "-tiles" or strParam == "-t":
+                args_index = args_index + 1
+                if args_index <= args_nb-1 and (sys.argv[args_index] == "none" or os.path.isdir(sys.argv[args_index])):
+                    map_tiles = sys.argv[args_index]
+                    print(f"Maps generated without network" + (" and without background." if map_tiles == "none" else f" with tiles from {map_tiles}."))
+                else:
+                    print(f"! Missing or invalid tiles directory")
+                    printInstructions()
+                    exit()
+            elif strParam == "-exclude" or strParam == "-x":
+                exclude = True
+                print(f"Exclude option activated.")
+            elif strParam == "-interactive" or strParam == "-i":
+                interactive = True
+                print(f"Interactive option activated.")
+            elif strParam == "-local" or strParam == "-l":
+                local = True
+                print(f"Local html option activated.")
+            elif strParam == "-convert" or strParam == "-c":
+                transcode = True
+                print(f"Videos conversion option activated.")
+            elif strParam == "-json" or strParam == "-o":
+                json_output = True
+                print(f"JSON option activated.")
+            elif strParam == "-database" or strParam == "-d":
+                args_index = args_index + 1
+                if args_index <= args_nb-1:
+                    database = os.path.abspath(sys.argv[args_index])
+                    print(f"Database option activated (indexing trip in {database}).")
+                else:
+                    print(f"! Not enough arguments : missing database file")
+                    printInstructions()
+                    exit()
+            elif strParam == "-v" or strParam == "-verbose":
+                verbose = True
+                print(f"Verbose option activated.")
+            elif strParam in ("-h", "-help", "--help"):
+                printInstructions()
+                exit()
             else:
-                print(f"! Not enough arguments : missing destination email")
+                print(f"! '{strParam}' is not an admitted parameter.")
                 printInstructions()
                 exit()
-        elif strParam == "-exclude" or strParam == "-x":
-            exclude = True
-            print(f"Exclude option activated.")
-        elif strParam == "-interactive" or strParam == "-i":
-            interactive = True
-            print(f"Interactive option activated.")
-        elif strParam == "-local" or strParam == "-l":
-            local = True
-            print(f"Local html option activated.")
-        elif strParam == "-v" or strParam == "-verbose":
-            verbose = True
-            print(f"Verbose option activated.")
-        else:
-            print(f"! '{strParam}' is not an admitted parameter.")
-            printInstructions()
-            exit()
-        args_index = args_index + 1
-# create extraction directory to store all generated files
-try:
-    Path(extract_dir).mkdir(parents=True, exist_ok=True)
-except:
-    print(f"! Could not create directory ({extract_dir}) to host files.")
-    exit()
-# analyze locations file to get route data
-loc_data = None
-if os.path.exists(map_file):
-    with open(map_file, encoding="utf-8") as f_in:
-        print(f"Extracting trip track from {map_file} file...")
-        loc_data = json.load(f_in)
-        no_location = False
-else:
-    print(f"! Locations file ({map_file}) not found.")
-# analyze trip file (with the most important information to extract)
-if os.path.exists(trip_file):
-    print(f"Extracting steps from {trip_file} file...")
-    with open(trip_file, encoding="utf-8") as f_in:
-        data = json.load(f_in)
-    parse_data(data, os.getcwd(), extract_dir, loc_data)
-else:
-    print(f"! Input file ({trip_file}) not found.")
-    printInstructions()
+            args_index = args_index + 1
+    if batch_path is not None and interactive:
+        print(f"! Interactive option cannot be used with batch option.")
+        exit()
+    if batch_path is not None:
+        extract_batch(batch_path)
+    elif os.path.exists(trip_file):
+        profiler = cProfile.Profile() if profile_stats else None
+        if profiler is not None:
+            profiler.enable()
+        extract_trip(os.getcwd())
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(extract_dir, "profile.pstats"))
+            print(f"Profile statistics written in {os.path.join(extract_dir, 'profile.pstats')} (python -m pstats {os.path.join(extract_dir, 'profile.pstats')}).")
+        if mail_sender is not None:
+            mail_sender.close()
+            print(f"{mail_sender.sent} email(s) sent using {mail_sender.connections} connection(s) to {mail_serv}.")
+        if cache_stats:
+            if media_cache is not None:
+                media_cache.print_stats()
+            else:
+                print("! Cache of resized photos not used (only used with email or interactive options).")
+        print_timings(time.perf_counter() - run_start)
+        if profile and os.path.isdir(extract_dir):
+            write_profile(extract_dir, time.perf_counter() - run_start)
+    else:
+        print(f"! Input file ({trip_file}) not found.")
+        printInstructions()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# PS extract tests, run with: python3 -m pytest tests
+#
+# SPDX-License-Identifier:    GPL-3.0-or-later license
+
+import sys
+import os
+import io
+import json
+import math
+import random
+import subprocess
+import socketserver
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract  # noqa: E402
+import benchmark  # noqa: E402
+
+
+# Function to return a random walk of n locations, as written in locations.json (not sorted by time)
+def random_locations(n, seed=1):
+    rand = random.Random(seed)
+    lat, lon = 45.0, 5.0
+    points = []
+    for number in range(n):
+        lat += rand.gauss(0, 0.01)
+        lon += rand.gauss(0, 0.01)
+        points.append({"lat": lat, "lon": lon, "time": 1700000000 + number * 60 + rand.choice((0, 0, -30))})
+    return points
+
+
+# Function to return a track of the locations in parameter
+def make_track(points):
+    track = extract.Track()
+    for point in points:
+        track.append(point)
+    track.sort()
+    return track
+
+
+# Class of a local SMTP server keeping the emails received, which can drop connections after each email
+class SmtpServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, drop=False):
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+        self.drop = drop
+        self.messages = []
+        self.connections = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+# Class answering SMTP commands of one connection to the test SMTP server
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b"220 test\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith(b"EHLO") or command.startswith(b"HELO"):
+                self.wfile.write(b"250-test\r\n250 SIZE 1000000000\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 end data with <CR><LF>.<CR><LF>\r\n")
+                lines = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b".") else data_line)  # undo dot stuffing
+                self.server.messages.append(b"".join(lines))
+                self.wfile.write(b"250 ok\r\n")
+                if self.server.drop:
+                    return
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+# Function to write an email with the text and attachments in parameter to the outbox file in parameter, returning its path
+def outbox_email(path, text, attachments=()):
+    msg = EmailMessage()
+    msg['Subject'] = "Test"
+    msg['From'] = "from@localhost"
+    msg['To'] = "to@localhost"
+    msg.set_content(text)
+    extract.write_message(str(path), msg, attachments)
+    return str(path)
+
+
+# Function to generate a small trip with the benchmark in the directory in parameter
+def generate_trip(path):
+    benchmark.steps, benchmark.photos, benchmark.videos, benchmark.locations = 3, 1, 0, 100
+    benchmark.photo_width, benchmark.photo_height = 320, 240
+    benchmark.generate_trip(str(path))
+
+
+# Function to run extract.py in the trip directory in parameter, emails being sent to the local server in parameter
+def run_extract(trip_path, args, server):
+    command = [sys.executable, "-c", benchmark.runner_code, str(server.server_address[1]), benchmark.script_path] + args
+    result = subprocess.run(command, cwd=str(trip_path), stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    monkeypatch.setattr(extract, "numpy", None)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1000, 1024 * 1024])
+def test_iter_locations_chunks(chunk_size):
+    points = random_locations(200)
+    text = json.dumps({"header": "x" * 100, "locations": points}, indent=1)
+    assert list(extract.iter_locations(io.StringIO(text), chunk_size)) == json.loads(text)["locations"]
+
+
+def test_iter_locations_empty():
+    assert list(extract.iter_locations(io.StringIO('{"locations": []}'), 4)) == []
+    assert list(extract.iter_locations(io.StringIO('{"other": 1}'), 4)) == []
+
+
+def test_track_sort_without_numpy(no_numpy):
+    points = random_locations(300)
+    track = make_track(points)
+    assert list(track.time) == sorted(point["time"] for point in points)
+
+
+def test_importance_numpy_and_python(monkeypatch):
+    track = make_track(random_locations(2000))
+    with_numpy = track.importance(5)
+    monkeypatch.setattr(extract, "numpy", None)
+    without_numpy = track.importance(5)
+    assert len(with_numpy) == len(without_numpy) == len(track)
+    for a, b in zip(with_numpy, without_numpy):
+        assert a == b or math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def test_simplify_numpy_and_python(monkeypatch):
+    track = make_track(random_locations(5000))
+    with_numpy = track.simplify(5, 800)
+    monkeypatch.setattr(extract, "numpy", None)
+    without_numpy = track.simplify(5, 800)
+    assert [(tolerance, list(level)) for tolerance, level in with_numpy] == [(tolerance, list(level)) for tolerance, level in without_numpy]
+    assert len(with_numpy[0][1]) <= 800
+    assert all(level[0] == 0 and level[-1] == len(track) - 1 for tolerance, level in with_numpy)  # ends of the route are always kept
+
+
+def test_encode_polyline_google_vector():
+    # example of the documentation of the Google encoded polyline format
+    lats, lons = [38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]
+    assert extract.encode_polyline(lats, lons, precision=5) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert extract.encode_polyline([], []) == ""
+
+
+def test_encoded_track_numpy_and_python(monkeypatch):
+    track = make_track(random_locations(100))
+    indexes = [0, 10, 50, 99]
+    with_numpy = track.encoded(indexes)
+    monkeypatch.setattr(extract, "numpy", None)
+    assert track.encoded(indexes) == with_numpy == extract.encode_polyline([track.lat[i] for i in indexes], [track.lon[i] for i in indexes])
+
+
+def test_search_words():
+    assert extract.search_words("Éléphant ROSE, café-crème") == ["elephant", "rose", "cafe", "creme"]
+    assert extract.search_words("Hà Nội_2024 Ærøskøbing") == ["ha", "noi", "2024", "ærøskøbing"]
+    assert extract.search_words("ﬁn du séjour !") == ["fin", "du", "sejour"]
+    assert extract.search_words("") == []
+
+
+def test_mail_sender_reuses_connection(tmp_path):
+    server = SmtpServer()
+    sender = extract.MailSender("127.0.0.1", server.server_address[1])
+    data = os.urandom(100000)
+    paths = [outbox_email(tmp_path / "1.eml", "first\n.line starting with a dot\n"),
+             outbox_email(tmp_path / "2.eml", "second", [("photo.jpg", "image/jpeg", data, len(data))])]
+    for path in paths:
+        sender.send(path, extract.read_headers(path))
+    sender.close()
+    server.shutdown()
+    assert sender.sent == 2 and sender.connections == 1 and server.connections == 1
+    for path, received in zip(paths, server.messages):
+        with open(path, 'rb') as f_in:
+            assert received == f_in.read().replace(b"\n", b"\r\n")
+    attachment = next(extract.BytesParser(policy=extract.policy.default).parsebytes(server.messages[1]).iter_attachments())
+    assert attachment.get_content() == data
+
+
+def test_mail_sender_reconnects(tmp_path):
+    server = SmtpServer(drop=True)
+    sender = extract.MailSender("127.0.0.1", server.server_address[1])
+    for number in range(3):
+        path = outbox_email(tmp_path / f"{number}.eml", f"email {number}")
+        sender.send(path, extract.read_headers(path))
+    sender.close()
+    server.shutdown()
+    assert sender.sent == 3 and len(server.messages) == 3
+    assert sender.connections == 3  # the server closed the connection after each email, it was opened again once each time
+
+
+def test_manifest_keeps_steps_of_trip(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = extract.Manifest(path, [1, 2])
+    manifest.set(('steps', 1, 'emailed'), True)
+    manifest.set(('steps', 2, 'page'), "abc")
+    manifest.save()
+    manifest = extract.Manifest(path, [2, 3])  # step 1 was removed from the trip, step 3 added
+    assert manifest.get(('steps', 1, 'emailed'), False) is False
+    assert manifest.get(('steps', 2, 'page')) == "abc"
+    assert manifest.get(('steps', 3, 'page')) is None
+
+
+def test_resume_skips_emailed_steps_and_unchanged_pages(tmp_path):
+    trip_path = tmp_path / "trip"
+    generate_trip(trip_path)
+    server = SmtpServer()
+    output = run_extract(trip_path, ["-e", "to@localhost", "-l", "-t", "none"], server)
+    assert len(server.messages) == 4  # 3 steps and the trip
+    assert "3 step page(s) written, 0 unchanged" in output
+    output = run_extract(trip_path, ["-e", "to@localhost", "-l", "-t", "none"], server)
+    server.shutdown()
+    assert len(server.messages) == 4
+    assert output.count("already emailed, not sent again") == 4
+    assert "0 step page(s) written, 3 unchanged" in output
+    assert os.listdir(trip_path / "Extracts" / "outbox") == []
+
+
+@pytest.mark.skipif(extract.Image is None, reason="pillow not installed")
+@pytest.mark.parametrize("max_size", [20000, 100000, 400000])
+def test_fit_photo(tmp_path, max_size):
+    path = str(tmp_path / "photo.jpg")
+    extract.Image.effect_noise((1600, 1200), 60).convert("RGB").save(path, quality=95)
+    data, elapsed = extract.fit_photo(path, max_size, max_height=800)
+    assert len(data) <= max_size
+    with extract.Image.open(io.BytesIO(data)) as image:
+        assert image.format == "JPEG" and image.size[1] <= 800